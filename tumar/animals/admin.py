@@ -10,7 +10,9 @@ from .models import (
     Farm,
     Animal,
     Geolocation,
+    GeolocationSyncCursor,
     Cadastre,
+    GeofenceEvent,
     BreedingStock,
     BreedingBull,
     Calf,
@@ -69,18 +71,35 @@ class GeolocationAdmin(admin.OSMGeoAdmin):
 
     @method_decorator(staff_member_required)
     def download_geolocations(self, request):
-        farms_attrs = Farm.objects.values_list("id", "api_key")
+        # farms with push_enabled get their geolocations from the webhook, the same
+        # as in the scheduled downloads
+        farms_attrs = Farm.objects.exclude(push_enabled=True).values_list(
+            "id", "api_key"
+        )
 
         for farm in farms_attrs:
             if farm[1]:
                 download_geolocations(farm[0], farm[1])
 
-        self.message_user(request, "Geolocations were just updated.")
+        self.message_user(
+            request, "Geolocations were just updated, farms with push were skipped."
+        )
         return HttpResponseRedirect("../")
 
     download_geolocations.short_description = "Download New Geolocation Data"
 
 
+@admin.register(GeolocationSyncCursor)
+class GeolocationSyncCursorAdmin(admin.ModelAdmin):
+    list_display = (
+        "farm",
+        "last_fix_time",
+        "dropped_outliers",
+        "dropped_stationary",
+        "updated",
+    )
+
+
 # @admin.register(Machinery)
 # class MachineryAdmin(admin.ModelAdmin):
 #     list_display = ('machinery_code', 'type', 'farm',)
@@ -150,5 +169,17 @@ class CadastreAdmin(admin.ModelAdmin):
     list_filter = ("farm",)
 
 
+@admin.register(GeofenceEvent)
+class GeofenceEventAdmin(admin.OSMGeoAdmin):
+    list_display = (
+        "animal",
+        "cadastre",
+        "event_type",
+        "time",
+    )
+    list_filter = ("event_type",)
+    raw_id_fields = ("animal", "cadastre")
+
+
 admin.site.site_header = _("Tumar Control Panel")
 admin.site.index_template = "memcache_status/admin_index.html"
@@ -5,3 +5,6 @@ from django.utils.translation import gettext_lazy as _
 class AnimalsConfig(AppConfig):
     name = "tumar.animals"
     verbose_name = _("Farms, Animals")
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,133 @@
+import gzip
+import json
+import logging
+import os
+import uuid
+import django.utils.timezone as tz
+
+from datetime import datetime as dt, timedelta
+
+from django.conf import settings
+
+logger = logging.getLogger()
+
+ARCHIVE_TIME_FORMAT = "%Y%m%dT%H%M%S%f"
+ARCHIVE_SUFFIX = ".json.gz"
+
+
+def get_archive_path(farm_pk, received):
+    """
+    Archived responses are kept in <TRACKER_ARCHIVE_DIR>/<farm>/<year>/<month>/,
+    the file names start with the UTC time the response was received at.
+    """
+    received = tz.localtime(received, tz.utc)
+    return os.path.join(
+        settings.TRACKER_ARCHIVE_DIR,
+        str(farm_pk),
+        received.strftime("%Y"),
+        received.strftime("%m"),
+        "{}_{}{}".format(
+            received.strftime(ARCHIVE_TIME_FORMAT), uuid.uuid4().hex[:8], ARCHIVE_SUFFIX
+        ),
+    )
+
+
+def archive_tracker_response(
+    farm_pk, url_type, geo_history, begintime=None, endtime=None
+):
+    """
+    Writes the raw geolocations response of the chinese API gzipped, before it is
+    parsed, so that it can be replayed without the API. Returns the file path,
+    None if archiving is disabled or failed.
+    """
+    if not settings.TRACKER_ARCHIVE_DIR:
+        return None
+
+    received = tz.now()
+    path = get_archive_path(farm_pk, received)
+    record = {
+        "farm": str(farm_pk),
+        "url_type": url_type,
+        "received": received.isoformat(),
+        "begintime": begintime,
+        "endtime": endtime,
+        "response": geo_history,
+    }
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # readers never see a partly written file
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as archive:
+            json.dump(record, archive, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+    except (OSError, TypeError, ValueError):
+        logger.exception("Response of farm {} is not archived.\n".format(farm_pk))
+        return None
+
+    return path
+
+
+def read_archived_response(path):
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        return json.load(archive)
+
+
+def get_archived_time(path):
+    return tz.make_aware(
+        dt.strptime(os.path.basename(path).split("_")[0], ARCHIVE_TIME_FORMAT), tz.utc
+    )
+
+
+def find_archived_responses(farm_pks=None, since=None, until=None):
+    """
+    Returns farm pk -> paths of the archived responses of the farm received in
+    [since, until), oldest first.
+    """
+    archive_dir = settings.TRACKER_ARCHIVE_DIR
+    if not archive_dir or not os.path.isdir(archive_dir):
+        return {}
+
+    found = {}
+    for farm_pk in sorted(farm_pks or os.listdir(archive_dir)):
+        paths = []
+        for root, _, file_names in os.walk(os.path.join(archive_dir, str(farm_pk))):
+            for file_name in file_names:
+                if not file_name.endswith(ARCHIVE_SUFFIX):
+                    continue
+                path = os.path.join(root, file_name)
+                received = get_archived_time(path)
+                if (since is None or since <= received) and (
+                    until is None or received < until
+                ):
+                    paths.append(path)
+        if paths:
+            found[str(farm_pk)] = sorted(paths, key=os.path.basename)
+
+    return found
+
+
+def prune_archived_responses(days):
+    """
+    Deletes the archived responses received more than `days` days ago and the
+    directories left empty. Returns the number of deleted files.
+    """
+    archive_dir = settings.TRACKER_ARCHIVE_DIR
+    if not archive_dir or not os.path.isdir(archive_dir):
+        return 0
+
+    cutoff = tz.now() - timedelta(days=days)
+    deleted = 0
+    for root, dir_names, file_names in os.walk(archive_dir, topdown=False):
+        for file_name in file_names:
+            # temporary files of interrupted writes are deleted too
+            if not file_name.endswith((ARCHIVE_SUFFIX, ARCHIVE_SUFFIX + ".tmp")):
+                continue
+            path = os.path.join(root, file_name)
+            if get_archived_time(path) < cutoff:
+                os.remove(path)
+                deleted += 1
+        if root != archive_dir and not os.listdir(root):
+            os.rmdir(root)
+
+    logger.info("{} archived responses deleted.\n".format(deleted))
+    return deleted
@@ -29,3 +29,11 @@ BREED_CHOICES = [
     (CROSS, _("Кросс")),
     (OTHER, _("Другое")),
 ]
+
+GEOFENCE_ENTER = "EN"
+GEOFENCE_EXIT = "EX"
+
+GEOFENCE_EVENT_CHOICES = [
+    (GEOFENCE_ENTER, _("Зашло на пастбище")),
+    (GEOFENCE_EXIT, _("Покинуло пастбище")),
+]
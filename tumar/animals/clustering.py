@@ -0,0 +1,86 @@
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+# members are indices into the clustered arrays, x/y is the center of their bbox
+Cluster = namedtuple("Cluster", ["members", "x", "y", "count", "latest_time"])
+
+# cells around a cell that still have to be compared with it, the other half
+# of the neighbours compares itself with the cell
+FORWARD_NEIGHBOUR_CELLS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def _find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]
+        i = parents[i]
+    return i
+
+
+def label_points(xs, ys, distance):
+    """
+    Labels points so that points closer than `distance` to each other, directly or
+    through other points, share the label. Points are hashed into a grid of
+    `distance`-sized cells, so only points of neighbouring cells are compared.
+    """
+    count = len(xs)
+    parents = np.arange(count)
+
+    if distance <= 0 or count < 2:
+        return parents
+
+    cells = defaultdict(list)
+    cell_xs = np.floor(xs / distance).astype(np.int64)
+    cell_ys = np.floor(ys / distance).astype(np.int64)
+    for i, cell in enumerate(zip(cell_xs.tolist(), cell_ys.tolist())):
+        cells[cell].append(i)
+    cells = {cell: np.array(members) for cell, members in cells.items()}
+
+    for (cell_x, cell_y), members in cells.items():
+        for dx, dy in FORWARD_NEIGHBOUR_CELLS:
+            neighbours = cells.get((cell_x + dx, cell_y + dy))
+            if neighbours is None:
+                continue
+
+            distances = np.hypot(
+                xs[members][:, None] - xs[neighbours][None, :],
+                ys[members][:, None] - ys[neighbours][None, :],
+            )
+            for i, j in zip(*np.nonzero(distances < distance)):
+                root_i = _find(parents, members[i])
+                root_j = _find(parents, neighbours[j])
+                if root_i != root_j:
+                    parents[root_j] = root_i
+
+    return np.array([_find(parents, i) for i in range(count)])
+
+
+def cluster_positions(xs, ys, times, distance):
+    """
+    Groups positions (EPSG:3857 metres) that are closer than `distance` metres.
+    Returns clusters with their bbox center, size and the latest time.
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    labels = label_points(xs, ys, distance)
+
+    clusters = []
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+
+    for members in np.split(order, boundaries):
+        if not len(members):
+            continue
+        member_xs = xs[members]
+        member_ys = ys[members]
+        clusters.append(
+            Cluster(
+                members=members.tolist(),
+                x=(member_xs.min() + member_xs.max()) / 2,
+                y=(member_ys.min() + member_ys.max()) / 2,
+                count=len(members),
+                latest_time=max(times[i] for i in members),
+            )
+        )
+
+    return clusters
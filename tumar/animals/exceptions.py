@@ -0,0 +1,15 @@
+class TrackerAPIUnavailableError(Exception):
+    def __init__(self, message=None, retry_after=None):
+        if retry_after and message:
+            message += (
+                "\nThe chinese API circuit is open, next attempt in {} seconds."
+            ).format(retry_after)
+        elif retry_after and not message:
+            message = (
+                "The chinese API circuit is open, next attempt in {} seconds."
+            ).format(retry_after)
+
+        # Call the base class constructor with the parameters it needs
+        super().__init__(message)
+
+        self.retry_after = retry_after
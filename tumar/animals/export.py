@@ -0,0 +1,79 @@
+import json
+
+from django.conf import settings
+from django.db.models import F, FloatField, Func, Value
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "geojson": "application/geo+json",
+}
+
+
+def get_trajectory_rows(geolocations_qs):
+    """
+    Yields (imei, time, lon, lat) of the geolocations, read with a server-side
+    cursor in chunks of GEOLOCATION_EXPORT_CHUNK_SIZE rows.
+    """
+    wgs84_position = Func(F("position"), Value(4326), function="ST_Transform")
+    qs = geolocations_qs.annotate(
+        lon=Func(wgs84_position, function="ST_X", output_field=FloatField()),
+        lat=Func(wgs84_position, function="ST_Y", output_field=FloatField()),
+    ).values_list("animal__imei", "time", "lon", "lat")
+
+    return qs.iterator(chunk_size=settings.GEOLOCATION_EXPORT_CHUNK_SIZE)
+
+
+def get_ndjson_line(imei, time, lon, lat):
+    return json.dumps({"imei": imei, "time": time.isoformat(), "lon": lon, "lat": lat})
+
+
+def get_geojson_feature(imei, time, lon, lat):
+    return json.dumps(
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {"imei": imei, "time": time.isoformat()},
+        }
+    )
+
+
+def _join_chunks(lines, separator):
+    """
+    Joins lines into strings of GEOLOCATION_EXPORT_CHUNK_SIZE lines, so that the
+    response is not written row by row.
+    """
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == settings.GEOLOCATION_EXPORT_CHUNK_SIZE:
+            yield separator.join(chunk)
+            chunk = []
+    if chunk:
+        yield separator.join(chunk)
+
+
+def stream_ndjson(geolocations_qs):
+    lines = (get_ndjson_line(*row) for row in get_trajectory_rows(geolocations_qs))
+    for chunk in _join_chunks(lines, "\n"):
+        yield chunk + "\n"
+
+
+def stream_geojson(geolocations_qs):
+    """
+    Yields a FeatureCollection of points without building it in memory.
+    """
+    features = (
+        get_geojson_feature(*row) for row in get_trajectory_rows(geolocations_qs)
+    )
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ""
+    for chunk in _join_chunks(features, ",\n"):
+        yield separator + chunk
+        separator = ",\n"
+    yield "]}\n"
+
+
+def stream_trajectory(geolocations_qs, export_format):
+    if export_format == "geojson":
+        return stream_geojson(geolocations_qs)
+    return stream_ndjson(geolocations_qs)
@@ -1,7 +1,7 @@
 from django.db.models import Q
 from django_filters import rest_framework as rest_filters
 
-from .models import Geolocation, Animal, BaseAnimal
+from .models import Geolocation, Animal, BaseAnimal, DailyMovementStats, StayPoint
 
 
 class AnimalPathFilter(rest_filters.FilterSet):
@@ -16,6 +16,33 @@ class AnimalPathFilter(rest_filters.FilterSet):
         ]
 
 
+class DailyMovementStatsFilter(rest_filters.FilterSet):
+    date = rest_filters.DateFromToRangeFilter(field_name="date")
+    imei = rest_filters.CharFilter(field_name="animal__imei")
+
+    class Meta:
+        model = DailyMovementStats
+        fields = [
+            "animal",
+            "imei",
+            "date",
+        ]
+
+
+class StayPointFilter(rest_filters.FilterSet):
+    date = rest_filters.DateFromToRangeFilter(field_name="date")
+    imei = rest_filters.CharFilter(field_name="animal__imei")
+
+    class Meta:
+        model = StayPoint
+        fields = [
+            "animal",
+            "imei",
+            "cadastre",
+            "date",
+        ]
+
+
 class AnimalNameTagNumberImeiFilter(rest_filters.FilterSet):
     search = rest_filters.CharFilter(method="filter_name_or_tag_number")
 
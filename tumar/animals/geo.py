@@ -0,0 +1,43 @@
+import numpy as np
+
+EARTH_RADIUS = 6378137.0  # metres, the sphere of EPSG:3857
+MAX_MERCATOR_LATITUDE = 85.0511287798066  # degrees, the square EPSG:3857 bounds
+
+
+def lonlat_to_mercator(lons, lats):
+    """
+    Converts longitudes and latitudes in degrees into EPSG:3857 coordinates, the
+    same as ST_Transform from EPSG:4326. Points out of the EPSG:3857 bounds get nan.
+    """
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    valid = (np.abs(lons) <= 180) & (np.abs(lats) <= MAX_MERCATOR_LATITUDE)
+    lons = np.where(valid, lons, np.nan)
+    lats = np.where(valid, lats, np.nan)
+
+    xs = EARTH_RADIUS * np.radians(lons)
+    ys = EARTH_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(lats) / 2))
+    return xs, ys
+
+
+def mercator_to_lonlat(xs, ys):
+    """
+    Converts EPSG:3857 coordinates into longitudes and latitudes in degrees.
+    """
+    lons = np.degrees(np.asarray(xs, dtype=float) / EARTH_RADIUS)
+    lats = np.degrees(
+        2 * np.arctan(np.exp(np.asarray(ys, dtype=float) / EARTH_RADIUS)) - np.pi / 2
+    )
+    return lons, lats
+
+
+def haversine(lons1, lats1, lons2, lats2):
+    """
+    Great-circle distances in metres between arrays of points in degrees.
+    """
+    lons1, lats1, lons2, lats2 = map(np.radians, (lons1, lats1, lons2, lats2))
+    a = (
+        np.sin((lats2 - lats1) / 2) ** 2
+        + np.cos(lats1) * np.cos(lats2) * np.sin((lons2 - lons1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1)))
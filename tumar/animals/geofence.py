@@ -0,0 +1,192 @@
+import logging
+import django.utils.timezone as tz
+
+from datetime import timedelta
+
+import numpy as np
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import transaction
+
+from ..celery import app
+from ..notify.models import Notification
+from .choices import GEOFENCE_ENTER, GEOFENCE_EXIT
+from .models import Animal, AnimalGeofenceState, Cadastre, GeofenceEvent
+
+logger = logging.getLogger()
+
+
+def get_fixes_inside(xs, ys, cadastres):
+    """
+    Returns a (fixes x cadastres) boolean matrix of fixes inside the cadastres.
+    Only the fixes inside the bbox of a cadastre are tested against its prepared
+    geometry.
+    """
+    inside = np.zeros((len(xs), len(cadastres)), dtype=bool)
+
+    for j, cadastre in enumerate(cadastres):
+        minx, miny, maxx, maxy = cadastre.geom.extent
+        candidates = np.flatnonzero(
+            (xs >= minx) & (xs <= maxx) & (ys >= miny) & (ys <= maxy)
+        )
+        if not len(candidates):
+            continue
+
+        prepared = cadastre.geom.prepared
+        for i in candidates.tolist():
+            inside[i, j] = prepared.intersects(Point(xs[i], ys[i], srid=3857))
+
+    return inside
+
+
+def get_geofence_events(fixes, inside, cadastre_ids, states):
+    """
+    Walks the fixes of every animal in time order and returns enter/exit events
+    against the previous state of the animal. `states` is updated in place, the
+    animals whose state was created or changed are returned too.
+    """
+    events = []
+    changed = set()
+    known_cadastres = set(cadastre_ids)
+    last_fixes = {fix.animal_id: i for i, fix in enumerate(fixes)}
+
+    for i, fix in enumerate(fixes):
+        current = {cadastre_ids[j] for j in np.flatnonzero(inside[i]).tolist()}
+        state = states.get(fix.animal_id)
+
+        if state is None:
+            # The first check only records where the animal is now, the history
+            # of a backfill is not replayed into events
+            last = last_fixes[fix.animal_id]
+            states[fix.animal_id] = AnimalGeofenceState(
+                animal_id=fix.animal_id,
+                cadastres=[
+                    cadastre_ids[j] for j in np.flatnonzero(inside[last]).tolist()
+                ],
+                time=fixes[last].time,
+            )
+            changed.add(fix.animal_id)
+            continue
+
+        if fix.time <= state.time:  # late fixes do not change the state
+            continue
+
+        previous = set(state.cadastres) & known_cadastres
+        position = Point(fix.x, fix.y, srid=3857)
+        for event_type, cadastres in (
+            (GEOFENCE_ENTER, current - previous),
+            (GEOFENCE_EXIT, previous - current),
+        ):
+            events.extend(
+                GeofenceEvent(
+                    animal_id=fix.animal_id,
+                    cadastre_id=cadastre_id,
+                    event_type=event_type,
+                    time=fix.time,
+                    position=position,
+                )
+                for cadastre_id in sorted(cadastres)
+            )
+
+        state.cadastres = sorted(current)
+        state.time = fix.time
+        changed.add(fix.animal_id)
+
+    return events, changed
+
+
+def check_geofences(the_farm, stored):
+    """
+    Checks newly stored fixes against the cadastres of the farm, records enter/exit
+    events and notifies the farmer when an animal leaves a pasture.
+    """
+    if not stored:
+        return []
+
+    cadastres = list(
+        Cadastre.objects.filter(farm=the_farm, geom__isnull=False).only(
+            "id", "geom", "title", "cad_number"
+        )
+    )
+    if not cadastres:
+        return []
+
+    fixes = sorted(stored, key=lambda fix: (fix.animal_id, fix.time))
+    inside = get_fixes_inside(
+        np.array([fix.x for fix in fixes], dtype=float),
+        np.array([fix.y for fix in fixes], dtype=float),
+        cadastres,
+    )
+
+    states = AnimalGeofenceState.objects.in_bulk({fix.animal_id for fix in fixes})
+    existing = set(states.keys())
+    events, changed = get_geofence_events(
+        fixes, inside, [cadastre.pk for cadastre in cadastres], states
+    )
+
+    with transaction.atomic():
+        AnimalGeofenceState.objects.bulk_create(
+            [states[pk] for pk in changed - existing], ignore_conflicts=True
+        )
+        AnimalGeofenceState.objects.bulk_update(
+            [states[pk] for pk in changed & existing], ["cadastres", "time"]
+        )
+        GeofenceEvent.objects.bulk_create(events)
+
+    # exits found in old fixes (backfills, replays) are recorded, not notified
+    notify_after = tz.now() - timedelta(
+        minutes=settings.GEOFENCE_NOTIFY_MAX_AGE_MINUTES
+    )
+    exits = [
+        event
+        for event in events
+        if event.event_type == GEOFENCE_EXIT and event.time >= notify_after
+    ]
+    if exits and the_farm.user_id:
+        notify_geofence_exits(the_farm, exits, cadastres)
+
+    logger.info(
+        "Farm {}: {} fixes checked against {} cadastres, {} geofence events.\n".format(
+            the_farm.pk, len(fixes), len(cadastres), len(events)
+        )
+    )
+
+    return events
+
+
+def notify_geofence_exits(the_farm, exits, cadastres):
+    cadastres = {cadastre.pk: cadastre for cadastre in cadastres}
+    animals = Animal.objects.only("name", "tag_number").in_bulk(
+        {event.animal_id for event in exits}
+    )
+
+    notifications = Notification.objects.bulk_create(
+        [
+            Notification(
+                receiver_id=the_farm.user_id,
+                content='Животное "{}" покинуло пастбище "{}"'.format(
+                    animals[event.animal_id],
+                    cadastres[event.cadastre_id].title
+                    or cadastres[event.cadastre_id].cad_number,
+                )[:255],
+            )
+            for event in exits
+        ]
+    )
+
+    for ntfcn, event in zip(notifications, exits):
+        if settings.DEBUG:
+            logger.info("Notification has been sent!")
+            continue
+
+        app.signature(
+            "send_push_notification.geofence_exit",
+            kwargs={
+                "notification_pk": ntfcn.pk,
+                "animal_pk": str(event.animal_id),
+                "cadastre_pk": event.cadastre_id,
+            },
+            queue="community_push_notifications",
+            priority=5,
+        ).delay()
@@ -0,0 +1,155 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .geo import haversine
+
+FilteredFixes = namedtuple("FilteredFixes", ["keep", "outliers", "stationary"])
+
+# Passes that split stationary runs. Runs of animals that slowly creep need one
+# pass per split, those still unsplit after the last pass are kept whole
+STATIONARY_MAX_PASSES = 16
+
+
+def get_outliers(same_animal, epochs, lons, lats, max_speed):
+    """
+    Marks spikes: fixes that are reached from the previous fix and left to the next
+    one faster than max_speed (m/s), while the previous and the next fix are
+    within max_speed of each other. The first and the last fix of every animal
+    are not marked, they have a neighbour on one side only.
+    """
+    outliers = np.zeros(len(epochs), dtype=bool)
+    if len(epochs) < 3:
+        return outliers
+
+    # speeds of the segments between fix i and fix i + 1
+    speeds = haversine(lons[:-1], lats[:-1], lons[1:], lats[1:]) / np.maximum(
+        np.diff(epochs), 1
+    )
+    skip_speeds = haversine(lons[:-2], lats[:-2], lons[2:], lats[2:]) / np.maximum(
+        epochs[2:] - epochs[:-2], 1
+    )
+    outliers[1:-1] = (
+        same_animal[:-1]
+        & same_animal[1:]
+        & (speeds[:-1] > max_speed)
+        & (speeds[1:] > max_speed)
+        & (skip_speeds <= max_speed)
+    )
+    return outliers
+
+
+def get_stationary(same_animal, lons, lats, radius):
+    """
+    Marks fixes inside stationary runs. A run starts at a fix and goes on while
+    the fixes stay within radius (metres) of that fix and of the previous fix,
+    only its first and last fix are not marked. Every pass splits the runs at
+    their first fix out of the radius of the run start.
+    """
+    count = len(lons)
+    stationary = np.zeros(count, dtype=bool)
+    if count < 3:
+        return stationary
+
+    indices = np.arange(count)
+    starts = np.ones(count, dtype=bool)
+    starts[1:] = ~same_animal
+    starts[1:] |= haversine(lons[:-1], lats[:-1], lons[1:], lats[1:]) >= radius
+
+    for _ in range(STATIONARY_MAX_PASSES):
+        anchors = np.maximum.accumulate(np.where(starts, indices, 0))
+        far = np.flatnonzero(
+            haversine(lons[anchors], lats[anchors], lons, lats) >= radius
+        )
+        if not len(far):
+            break
+        # only the first far fix of a run is certainly a new start
+        _, first = np.unique(anchors[far], return_index=True)
+        starts[far[first]] = True
+    else:
+        anchors = np.maximum.accumulate(np.where(starts, indices, 0))
+        far = haversine(lons[anchors], lats[anchors], lons, lats) >= radius
+        starts |= np.isin(anchors, anchors[far])
+
+    ends = np.ones(count, dtype=bool)
+    ends[:-1] = starts[1:]
+    stationary[:] = ~starts & ~ends
+    return stationary
+
+
+def get_trailing_outliers(same_animal, epochs, lons, lats, max_speed):
+    """
+    Marks the last fix of every animal when it is reached from the previous fix
+    faster than max_speed (m/s). The newest fix of a batch has no next fix, so it
+    is only checked on this side.
+    """
+    outliers = np.zeros(len(epochs), dtype=bool)
+    if len(epochs) < 2:
+        return outliers
+
+    speeds = haversine(lons[:-1], lats[:-1], lons[1:], lats[1:]) / np.maximum(
+        np.diff(epochs), 1
+    )
+    is_last = np.ones(len(epochs), dtype=bool)
+    is_last[:-1] = ~same_animal
+    outliers[1:] = is_last[1:] & same_animal & (speeds > max_speed)
+    return outliers
+
+
+def filter_fixes(
+    animal_ids,
+    epochs,
+    lons,
+    lats,
+    max_speed=0,
+    stationary_radius=0,
+    context=None,
+):
+    """
+    Chooses the fixes worth storing from fixes ordered by animal and time: drops
+    GPS spikes faster than max_speed (m/s) and collapses runs of fixes within
+    stationary_radius (metres) into their first and last fix. 0 disables a step.
+    Fixes marked in `context` (e.g. the last stored fix of the animals) are only
+    compared with, they are never dropped. Returns boolean masks of the fixes.
+    """
+    animal_ids = np.asarray(animal_ids)
+    epochs = np.asarray(epochs, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    count = len(epochs)
+    if context is None:
+        context = np.zeros(count, dtype=bool)
+    else:
+        context = np.asarray(context, dtype=bool)
+
+    outliers = np.zeros(count, dtype=bool)
+    if max_speed and count:
+        same_animal = animal_ids[1:] == animal_ids[:-1]
+        outliers = get_outliers(same_animal, epochs, lons, lats, max_speed) & ~context
+
+        kept = np.flatnonzero(~outliers)
+        kept_animal_ids = animal_ids[kept]
+        trailing = get_trailing_outliers(
+            kept_animal_ids[1:] == kept_animal_ids[:-1],
+            epochs[kept],
+            lons[kept],
+            lats[kept],
+            max_speed,
+        )
+        outliers[kept[trailing]] = True
+        outliers &= ~context
+
+    stationary = np.zeros(count, dtype=bool)
+    if stationary_radius and count:
+        kept = np.flatnonzero(~outliers)
+        kept_animal_ids = animal_ids[kept]
+        interior = get_stationary(
+            kept_animal_ids[1:] == kept_animal_ids[:-1],
+            lons[kept],
+            lats[kept],
+            stationary_radius,
+        )
+        stationary[kept[interior]] = True
+        stationary &= ~context
+
+    return FilteredFixes(~outliers & ~stationary, outliers, stationary)
@@ -0,0 +1,189 @@
+import logging
+import math
+import zlib
+import django.utils.timezone as tz
+import numpy as np
+
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .geo import mercator_to_lonlat
+from .models import Animal, Geolocation
+from .staypoints import get_day_bounds
+
+logger = logging.getLogger()
+
+# Origin is the south-west corner of the cadastre bbox, cells are EPSG:3857 units
+GridSpec = namedtuple("GridSpec", ["minx", "miny", "cell_size", "width", "height"])
+
+# Every fix weighs the minutes until the next fix of the animal, so that the inner
+# fixes dropped from stationary runs still count. Fixes after the end are only
+# read as next fixes
+GET_CADASTRE_FIXES_SQL = """
+    SELECT fix.time, ST_X(fix.position), ST_Y(fix.position), fix.minutes
+    FROM (
+        SELECT
+            fix.time,
+            fix.position,
+            COALESCE(
+                LEAST(
+                    extract(
+                        epoch FROM lead(fix.time) OVER (
+                            PARTITION BY fix.animal_id ORDER BY fix.time
+                        ) - fix.time
+                    ) / 60,
+                    %(max_minutes)s
+                ),
+                0
+            ) AS minutes
+        FROM {geolocation} fix
+        JOIN {animal} animal ON animal.id = fix.animal_id
+        WHERE animal.farm_id = %(farm)s
+            AND fix.time >= %(start)s AND fix.time < %(next_end)s
+    ) fix
+    WHERE fix.time < %(end)s
+        AND ST_Intersects(fix.position, ST_GeomFromEWKB(%(geom)s))
+""".format(
+    geolocation=Geolocation._meta.db_table, animal=Animal._meta.db_table
+)
+
+
+def get_grid_spec(cadastre):
+    """
+    Covers the cadastre bbox with cells of HEATMAP_CELL_SIZE metres, at most
+    HEATMAP_MAX_CELLS per side.
+    """
+    minx, miny, maxx, maxy = cadastre.geom.extent
+    _, lats = mercator_to_lonlat([0], [(miny + maxy) / 2])
+    cell_size = settings.HEATMAP_CELL_SIZE / math.cos(math.radians(lats[0]))
+    cell_size = max(
+        cell_size,
+        (maxx - minx) / settings.HEATMAP_MAX_CELLS,
+        (maxy - miny) / settings.HEATMAP_MAX_CELLS,
+    )
+    return GridSpec(
+        minx,
+        miny,
+        cell_size,
+        max(1, math.ceil((maxx - minx) / cell_size)),
+        max(1, math.ceil((maxy - miny) / cell_size)),
+    )
+
+
+def get_day_grid_key(cadastre, spec, day):
+    # the spec is a part of the key, so that edited geometries get new grids
+    return "heatmap_minutes_{}_{}_{:.0f}_{:.0f}_{}x{}".format(
+        cadastre.pk, day.strftime("%Y%m%d"), spec.minx, spec.miny, *spec[3:]
+    )
+
+
+def bin_positions(spec, xs, ys, weights):
+    """
+    Returns the (width x height) sums of the weights of the positions in the cells.
+    """
+    grid, _, _ = np.histogram2d(
+        xs,
+        ys,
+        weights=weights,
+        bins=(spec.width, spec.height),
+        range=(
+            (spec.minx, spec.minx + spec.width * spec.cell_size),
+            (spec.miny, spec.miny + spec.height * spec.cell_size),
+        ),
+    )
+    return grid.astype(np.float32)
+
+
+def build_day_grids(cadastre, spec, days):
+    """
+    Bins the minutes the farm animals spent inside the cadastre during the local
+    days with one query and caches the grid of every day.
+    """
+    max_gap = timedelta(minutes=settings.HEATMAP_MAX_GAP_MINUTES)
+    start, _ = get_day_bounds(min(days))
+    _, end = get_day_bounds(max(days))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            GET_CADASTRE_FIXES_SQL,
+            {
+                "farm": cadastre.farm_id,
+                "start": start,
+                "end": end,
+                "next_end": end + max_gap,
+                "max_minutes": settings.HEATMAP_MAX_GAP_MINUTES,
+                "geom": bytes(cadastre.geom.ewkb),
+            },
+        )
+        rows = cursor.fetchall()
+
+    row_days = np.array([tz.localtime(row[0]).date().toordinal() for row in rows])
+    xs = np.array([row[1] for row in rows], dtype=float)
+    ys = np.array([row[2] for row in rows], dtype=float)
+    minutes = np.array([row[3] for row in rows], dtype=float)
+
+    today = tz.localdate()
+    grids = {}
+    for day in days:
+        in_day = row_days == day.toordinal()
+        grids[day] = bin_positions(spec, xs[in_day], ys[in_day], minutes[in_day])
+        cache.set(
+            get_day_grid_key(cadastre, spec, day),
+            zlib.compress(grids[day].tobytes()),
+            settings.HEATMAP_TODAY_CACHE_TIMEOUT
+            if day >= today
+            else settings.HEATMAP_CACHE_TIMEOUT,
+        )
+
+    return grids
+
+
+def get_cadastre_heatmap(cadastre, start_date, end_date):
+    """
+    Returns the grid spec and the minutes the farm animals spent in every cell of
+    the cadastre from start_date to end_date (included), summed from cached
+    per-day grids.
+    """
+    spec = get_grid_spec(cadastre)
+    days = [
+        start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)
+    ]
+    keys = {get_day_grid_key(cadastre, spec, day): day for day in days}
+    cached = cache.get_many(keys.keys())
+
+    heatmap = np.zeros((spec.width, spec.height), dtype=np.float32)
+    for key, data in cached.items():
+        heatmap += np.frombuffer(zlib.decompress(data), dtype=np.float32).reshape(
+            spec.width, spec.height
+        )
+
+    missing = [day for key, day in keys.items() if key not in cached]
+    if missing:
+        for grid in build_day_grids(cadastre, spec, missing).values():
+            heatmap += grid
+
+    return spec, heatmap
+
+
+def get_pasture_load(cadastre, start_date, end_date):
+    """
+    Summary of the grazing density of the cadastre used by the pasture load
+    analysis.
+    """
+    spec, heatmap = get_cadastre_heatmap(cadastre, start_date, end_date)
+    cells_area = spec.cell_size**2
+    grazed_area = np.count_nonzero(heatmap) * cells_area
+
+    return {
+        "cadastre": cadastre.pk,
+        "title": cadastre.title or cadastre.cad_number,
+        "animal_hours": round(float(heatmap.sum()) / 60, 1),
+        # both areas are in EPSG:3857 units, their ratio does not depend on it
+        "grazed_share": min(1.0, grazed_area / cadastre.geom.area)
+        if cadastre.geom.area
+        else 0,
+        "max_cell_minutes": int(round(float(heatmap.max()))),
+    }
@@ -0,0 +1,448 @@
+import logging
+import pytz
+import django.utils.timezone as tz
+import numpy as np
+
+from collections import defaultdict, namedtuple
+from datetime import datetime as dt
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.utils import DataError, InternalError
+from psycopg2.extras import execute_values
+
+from .geo import lonlat_to_mercator, mercator_to_lonlat
+from .geofence import check_geofences
+from .gpsfilter import filter_fixes
+from .live import publish_fixes
+from .models import (
+    Animal,
+    AnimalLastPosition,
+    BatteryTelemetry,
+    Geolocation,
+    GeolocationSyncCursor,
+)
+from .tiles import invalidate_cluster_tiles, refresh_cluster_tiles
+
+logger = logging.getLogger()
+
+TRACKER_TIMEZONE = pytz.timezone("Asia/Almaty")
+TRACKER_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+INSERT_GEOLOCATIONS_SQL = """
+    INSERT INTO {table} (animal_id, time, position)
+    VALUES %s
+    ON CONFLICT (animal_id, time) DO NOTHING
+    RETURNING animal_id, time, ST_X(position), ST_Y(position)
+"""
+# positions are projected to EPSG:3857 before the insert, see project_geolocation_rows
+INSERT_GEOLOCATIONS_TEMPLATE = "(%s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 3857))"
+
+UPSERT_LAST_POSITIONS_SQL = """
+    INSERT INTO {table} AS last (animal_id, time, position, geolocation_id)
+    VALUES %s
+    ON CONFLICT (animal_id) DO UPDATE
+        SET time = EXCLUDED.time,
+            position = EXCLUDED.position,
+            geolocation_id = EXCLUDED.geolocation_id
+        WHERE last.time < EXCLUDED.time
+"""
+UPSERT_LAST_POSITIONS_TEMPLATE = """(
+    %s,
+    %s,
+    ST_SetSRID(ST_MakePoint(%s, %s), 3857),
+    (SELECT id FROM {geolocation} WHERE animal_id = %s AND time = %s)
+)""".format(
+    geolocation=Geolocation._meta.db_table
+)
+
+# Stored fixes of the animals from the newest one before (animal_id, time) on
+STORED_CONTEXT_SQL = """
+    SELECT batch.animal_id, fix.time, ST_X(fix.position), ST_Y(fix.position)
+    FROM (VALUES %s) AS batch (animal_id, time)
+    CROSS JOIN LATERAL (
+        (
+            SELECT time, position FROM {table}
+            WHERE animal_id = batch.animal_id AND time < batch.time
+            ORDER BY time DESC
+            LIMIT 1
+        )
+        UNION ALL
+        SELECT time, position FROM {table}
+        WHERE animal_id = batch.animal_id AND time >= batch.time
+    ) AS fix
+"""
+
+# A fix that made it into the Geolocation table, position is in EPSG:3857
+StoredFix = namedtuple("StoredFix", ["animal_id", "time", "x", "y"])
+
+
+def parse_tracker_locations(locations):
+    """
+    Converts location items of the chinese API into (imei, time, lon, lat) tuples.
+    Malformed items are skipped.
+    """
+    parsed = []
+
+    for location in locations:
+        try:
+            time = tz.make_aware(
+                dt.strptime(location["CreateTime"], TRACKER_TIME_FORMAT),
+                TRACKER_TIMEZONE,
+            )
+            parsed.append(
+                (
+                    str(location["imei"]),
+                    time,
+                    float(location["longitude"]),
+                    float(location["latitude"]),
+                )
+            )
+        except (KeyError, TypeError, ValueError):
+            logger.info("Wrong Chinese API attributes.\n")
+
+    return parsed
+
+
+def resolve_animals(the_farm, imeis):
+    """
+    Returns IMEI -> animal pk mapping. Unknown IMEIs are added to the farm in bulk.
+    """
+    imeis = set(imeis)
+    animal_ids = dict(Animal.objects.filter(imei__in=imeis).values_list("imei", "id"))
+    unknown_imeis = imeis - animal_ids.keys()
+
+    if unknown_imeis:
+        Animal.objects.bulk_create(
+            [Animal(farm=the_farm, imei=imei) for imei in unknown_imeis],
+            ignore_conflicts=True,
+        )
+        animal_ids.update(
+            Animal.objects.filter(imei__in=unknown_imeis).values_list("imei", "id")
+        )
+        logger.info(
+            "{} new animals are added to farm {}.\n".format(
+                len(unknown_imeis), the_farm.pk
+            )
+        )
+
+    return animal_ids
+
+
+def get_stored_context(rows):
+    """
+    Returns the stored fixes of the animals of the (animal_id, time, lon, lat) rows
+    as (animal_id, time, lon, lat) rows: the newest fix before the first row of
+    every animal and all the fixes from that row on.
+    """
+    first_times = {}
+    for animal_id, time, *_ in rows:
+        if animal_id not in first_times or time < first_times[animal_id]:
+            first_times[animal_id] = time
+    if not first_times:
+        return []
+
+    with connection.cursor() as cursor:
+        stored = execute_values(
+            cursor,
+            STORED_CONTEXT_SQL.format(table=Geolocation._meta.db_table),
+            list(first_times.items()),
+            page_size=len(first_times),
+            fetch=True,
+        )
+
+    lons, lats = mercator_to_lonlat(
+        [fix[2] for fix in stored], [fix[3] for fix in stored]
+    )
+    return [
+        (animal_id, time, lon, lat)
+        for (animal_id, time, *_), lon, lat in zip(stored, lons.tolist(), lats.tolist())
+    ]
+
+
+def filter_geolocation_rows(the_farm, rows):
+    """
+    Drops GPS outliers and the inner fixes of stationary runs from (animal_id, time,
+    lon, lat) rows ordered by animal and time. Stored fixes of the animals are
+    compared with the rows and never dropped, so that the edges of a batch are
+    checked and the re-downloaded overlap is compressed as it was the first time.
+    Dropped fixes newer than the sync cursor of the farm are counted on the cursor,
+    the re-downloaded overlap is not counted again.
+    """
+    context_rows = {row[:2]: row for row in get_stored_context(rows)}
+
+    # (row, is stored) ordered by animal and time, stored fixes replace the rows
+    entries = sorted(
+        [(row, False) for row in rows if row[:2] not in context_rows]
+        + [(row, True) for row in context_rows.values()],
+        key=lambda entry: entry[0][:2],
+    )
+
+    filtered = filter_fixes(
+        [row[0] for row, _ in entries],
+        [row[1].timestamp() for row, _ in entries],
+        [row[2] for row, _ in entries],
+        [row[3] for row, _ in entries],
+        max_speed=settings.GEOLOCATION_MAX_SPEED,
+        stationary_radius=settings.GEOLOCATION_STATIONARY_RADIUS,
+        context=[is_stored for _, is_stored in entries],
+    )
+
+    cursor_time = (
+        GeolocationSyncCursor.objects.filter(farm=the_farm)
+        .values_list("last_fix_time", flat=True)
+        .first()
+    )
+    counted = np.array(
+        [
+            not is_stored and (cursor_time is None or row[1] > cursor_time)
+            for row, is_stored in entries
+        ],
+        dtype=bool,
+    )
+    outliers = int((filtered.outliers & counted).sum())
+    stationary = int((filtered.stationary & counted).sum())
+
+    if outliers or stationary:
+        GeolocationSyncCursor.objects.filter(farm=the_farm).update(
+            dropped_outliers=F("dropped_outliers") + outliers,
+            dropped_stationary=F("dropped_stationary") + stationary,
+        )
+        logger.info(
+            "Farm {}: {} outliers and {} stationary fixes dropped.\n".format(
+                the_farm.pk, outliers, stationary
+            )
+        )
+
+    return [
+        row
+        for (row, is_stored), keep in zip(entries, filtered.keep.tolist())
+        if keep and not is_stored
+    ]
+
+
+def project_geolocation_rows(rows):
+    """
+    Converts (animal_id, time, lon, lat) rows into (animal_id, time, x, y) rows in
+    EPSG:3857, all at once. Rows out of the EPSG:3857 bounds are skipped.
+    """
+    xs, ys = lonlat_to_mercator([row[2] for row in rows], [row[3] for row in rows])
+    valid = np.isfinite(xs) & np.isfinite(ys)
+
+    if not valid.all():
+        logger.info(
+            "Wrong Chinese API attributes: {} fixes out of bounds.\n".format(
+                int(len(valid) - valid.sum())
+            )
+        )
+
+    return [
+        (row[0], row[1], x, y)
+        for row, x, y, is_valid in zip(rows, xs.tolist(), ys.tolist(), valid.tolist())
+        if is_valid
+    ]
+
+
+def insert_geolocation_chunk(sql, chunk):
+    """
+    Inserts the rows in one statement. If the database rejects the statement, the
+    rows are split in halves and inserted again, so that only the rejected rows are
+    lost. Returns (stored fixes, number of rejected rows).
+    """
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            return (
+                [
+                    StoredFix(*row)
+                    for row in execute_values(
+                        cursor,
+                        sql,
+                        chunk,
+                        template=INSERT_GEOLOCATIONS_TEMPLATE,
+                        page_size=len(chunk),
+                        fetch=True,
+                    )
+                ],
+                0,
+            )
+    except (DataError, InternalError):
+        if len(chunk) == 1:
+            logger.info("Wrong Chinese API attributes: {}.\n".format(chunk[0]))
+            return [], 1
+
+    middle = len(chunk) // 2
+    stored, rejected = insert_geolocation_chunk(sql, chunk[:middle])
+    more_stored, more_rejected = insert_geolocation_chunk(sql, chunk[middle:])
+    return stored + more_stored, rejected + more_rejected
+
+
+def write_geolocations(rows, chunk_size=None):
+    """
+    Inserts (animal_id, time, x, y) rows chunk by chunk, one statement per chunk.
+    Rows that already exist are skipped by the (animal, time) unique constraint.
+    """
+    chunk_size = chunk_size or settings.GEOLOCATION_INGEST_CHUNK_SIZE
+    sql = INSERT_GEOLOCATIONS_SQL.format(table=Geolocation._meta.db_table)
+    stored = []
+    rejected = 0
+
+    for start in range(0, len(rows), chunk_size):
+        chunk_stored, chunk_rejected = insert_geolocation_chunk(
+            sql, rows[start : start + chunk_size]
+        )
+        stored.extend(chunk_stored)
+        rejected += chunk_rejected
+
+    if rejected:
+        logger.info("{} fixes rejected by the database.\n".format(rejected))
+
+    return stored
+
+
+def update_last_positions(stored):
+    """
+    Moves the last known position of the animals forward to their newest stored fix.
+    """
+    newest = {}
+    for fix in stored:
+        if fix.animal_id not in newest or newest[fix.animal_id].time < fix.time:
+            newest[fix.animal_id] = fix
+
+    if not newest:
+        return
+
+    with connection.cursor() as cursor:
+        execute_values(
+            cursor,
+            UPSERT_LAST_POSITIONS_SQL.format(table=AnimalLastPosition._meta.db_table),
+            [
+                (fix.animal_id, fix.time, fix.x, fix.y, fix.animal_id, fix.time)
+                for fix in newest.values()
+            ],
+            template=UPSERT_LAST_POSITIONS_TEMPLATE,
+            page_size=settings.GEOLOCATION_INGEST_CHUNK_SIZE,
+        )
+
+
+def ingest_geolocations(the_farm, locations, chunk_size=None):
+    """
+    Stores location items of the chinese API for the farm.
+    Returns the list of fixes that were not in the database yet.
+    """
+    parsed = parse_tracker_locations(locations)
+    if not parsed:
+        return []
+
+    animal_ids = resolve_animals(the_farm, (imei for imei, *_ in parsed))
+
+    # (animal, time) pairs are unique in the table, so they must be in a chunk too
+    rows = {
+        (animal_ids[imei], time): (animal_ids[imei], time, lon, lat)
+        for imei, time, lon, lat in parsed
+    }
+    rows = filter_geolocation_rows(the_farm, [rows[key] for key in sorted(rows)])
+    rows = project_geolocation_rows(rows)
+
+    stored = write_geolocations(rows, chunk_size)
+    update_last_positions(stored)
+
+    if stored:
+        refresh_cluster_tiles(the_farm.pk)
+        try:
+            check_geofences(the_farm, stored)
+        except Exception:
+            # fixes are stored already, a failed check must not fail the sync
+            logger.exception("Geofence check failed for farm {}.\n".format(the_farm.pk))
+        try:
+            publish_fixes(the_farm.pk, stored)
+        except Exception:
+            logger.exception(
+                "Live positions of farm {} not published.\n".format(the_farm.pk)
+            )
+
+    logger.info(
+        "Farm {}: {} fixes received, {} new fixes stored.\n".format(
+            the_farm.pk, len(parsed), len(stored)
+        )
+    )
+
+    return stored
+
+
+def parse_battery_items(items):
+    """
+    Converts battery items of the chinese API into imei -> (time, voltage, imsi).
+    Items without voltage and malformed items are skipped.
+    """
+    parsed = {}
+
+    for item in items:
+        if not item.get("voltage", None):
+            continue
+        try:
+            time = tz.make_aware(
+                dt.strptime(item["lastupdate"], TRACKER_TIME_FORMAT), TRACKER_TIMEZONE
+            )
+            parsed[str(item["imei"])] = (
+                time,
+                Decimal(str(item["voltage"])),
+                item.get("imsi", "") or "",
+            )
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            logger.info("Wrong Chinese API attributes.\n")
+
+    return parsed
+
+
+def ingest_battery_telemetry(farm_pk, items):
+    """
+    Applies the latest battery charge of each tracker to its animal and appends the
+    readings to the battery telemetry history.
+    """
+    parsed = parse_battery_items(items)
+    changed_animals = defaultdict(list)  # changed fields -> animals
+    telemetry = []
+
+    animals = Animal.objects.filter(imei__in=parsed.keys()).only(
+        "id", "imei", "imsi", "battery_charge", "battery_updated"
+    )
+    for animal in animals:
+        time, voltage, imsi = parsed[animal.imei]
+        telemetry.append(BatteryTelemetry(animal=animal, time=time, voltage=voltage))
+
+        if animal.battery_updated is not None and animal.battery_updated >= time:
+            continue
+
+        fields = ["battery_updated"]
+        animal.battery_updated = time
+        if animal.battery_charge != voltage:
+            animal.battery_charge = voltage
+            fields.append("battery_charge")
+        if not animal.imsi and imsi:
+            animal.imsi = imsi
+            fields.append("imsi")
+        changed_animals[tuple(fields)].append(animal)
+
+    for fields, field_animals in changed_animals.items():
+        Animal.objects.bulk_update(
+            field_animals,
+            fields,
+            batch_size=settings.GEOLOCATION_INGEST_CHUNK_SIZE,
+        )
+    if changed_animals:
+        # bulk updates send no signals, the cluster tiles show the battery charge
+        invalidate_cluster_tiles(farm_pk)
+    BatteryTelemetry.objects.bulk_create(
+        telemetry,
+        batch_size=settings.GEOLOCATION_INGEST_CHUNK_SIZE,
+        ignore_conflicts=True,
+    )
+    logger.info(
+        "Farm {}: {} battery readings received, {} animals updated.\n".format(
+            farm_pk,
+            len(parsed),
+            sum(len(field_animals) for field_animals in changed_animals.values()),
+        )
+    )
@@ -0,0 +1,144 @@
+import json
+import queue
+import threading
+import time
+
+import redis
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_brokers = {}
+
+
+class RedisBroker:
+    """
+    Publishes live positions through Redis pub/sub, shared by the workers that
+    ingest fixes and the web workers that stream them.
+    """
+
+    def __init__(self):
+        self.redis = redis.Redis.from_url(settings.LIVE_POSITIONS_REDIS_URL)
+
+    def publish(self, channel, message):
+        self.redis.publish(channel, message)
+
+    def subscribe(self, channel):
+        return RedisSubscription(self.redis, channel)
+
+
+class RedisSubscription:
+    def __init__(self, connection, channel):
+        self.pubsub = connection.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel)
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return message["data"].decode()
+
+    def close(self):
+        self.pubsub.close()
+
+
+class InProcessBroker:
+    """
+    Stand-in for Redis that only reaches subscribers of the same process, used by
+    tests and local development.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.messages.put(message)
+
+    def subscribe(self, channel):
+        subscription = InProcessSubscription(self, channel)
+        with self.lock:
+            self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, channel, subscription):
+        with self.lock:
+            self.subscriptions.get(channel, set()).discard(subscription)
+
+
+class InProcessSubscription:
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.messages = queue.Queue()
+
+    def get(self, timeout):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self.channel, self)
+
+
+def get_live_broker():
+    """
+    Returns the shared broker of the class set in LIVE_POSITIONS_BROKER.
+    """
+    broker_path = settings.LIVE_POSITIONS_BROKER
+    if broker_path not in _brokers:
+        _brokers[broker_path] = import_string(broker_path)()
+    return _brokers[broker_path]
+
+
+def get_farm_channel(farm_pk):
+    return "live_positions_{}".format(farm_pk)
+
+
+def publish_fixes(farm_pk, stored):
+    """
+    Publishes the newest of the stored fixes of every animal to the farm channel.
+    """
+    newest = {}
+    for fix in stored:
+        if fix.animal_id not in newest or newest[fix.animal_id].time < fix.time:
+            newest[fix.animal_id] = fix
+
+    message = json.dumps(
+        {
+            "positions": [
+                {
+                    "animal": str(fix.animal_id),
+                    "time": fix.time.isoformat(),
+                    "position": [fix.x, fix.y],
+                }
+                for fix in newest.values()
+            ]
+        }
+    )
+    get_live_broker().publish(get_farm_channel(farm_pk), message)
+
+
+def stream_farm_positions(farm_pk):
+    """
+    Yields Server-Sent Events with the new positions of the farm animals. Comments
+    are sent when nothing happens, so that proxies keep the connection, which is
+    closed after LIVE_STREAM_MAX_SECONDS for the client to reconnect.
+    """
+    subscription = get_live_broker().subscribe(get_farm_channel(farm_pk))
+    deadline = time.monotonic() + settings.LIVE_STREAM_MAX_SECONDS
+
+    try:
+        yield "retry: {}\n\n".format(settings.LIVE_STREAM_RETRY_MILLISECONDS)
+        while time.monotonic() < deadline:
+            message = subscription.get(settings.LIVE_STREAM_HEARTBEAT_SECONDS)
+            if message is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield "event: positions\ndata: {}\n\n".format(message)
+    finally:
+        subscription.close()
@@ -0,0 +1,82 @@
+import functools
+import logging
+import time
+import uuid
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger()
+
+GEOLOCATIONS_SYNC_LOCK = "geolocations_sync"
+BATTERY_SYNC_LOCK = "battery_sync"
+
+
+def _release(key, value):
+    # Do not delete a key that has expired and was taken by somebody else since
+    if cache.get(key) == value:
+        cache.delete(key)
+
+
+def get_farm_lock_key(name, farm_pk):
+    return "{}_lock_{}".format(name, farm_pk)
+
+
+@contextmanager
+def farm_lock(name, farm_pk, timeout):
+    """
+    Takes the named lock of the farm in the shared cache. Yields True if the lock
+    was taken, False if somebody else holds it.
+    """
+    key = get_farm_lock_key(name, farm_pk)
+    value = (uuid.uuid4().hex, time.time())
+
+    if not cache.add(key, value, timeout):
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        _release(key, value)
+
+
+def get_farm_lock_age(name, farm_pk):
+    """
+    Returns for how many seconds the named lock of the farm has been held,
+    or None if it is free.
+    """
+    value = cache.get(get_farm_lock_key(name, farm_pk))
+    if value is None:
+        return None
+    return time.time() - value[1]
+
+
+def single_flight(name):
+    """
+    Skips a call of the decorated function if another call for the same farm
+    is still running. The farm pk must be the first argument of the function.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(farm_pk, *args, **kwargs):
+            with farm_lock(
+                name, farm_pk, settings.TRACKER_SYNC_FARM_TIME_LIMIT + 60
+            ) as acquired:
+                if not acquired:
+                    logger.info(
+                        "Skipping {} for farm {}: locked for {:.0f} s.\n".format(
+                            func.__name__,
+                            farm_pk,
+                            get_farm_lock_age(name, farm_pk) or 0,
+                        )
+                    )
+                    return None
+                return func(farm_pk, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
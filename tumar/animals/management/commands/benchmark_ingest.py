@@ -0,0 +1,138 @@
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from ... import tracker_api
+from ...models import Animal, Farm, Geolocation
+from ...simulator import SimulatedFleet, SimulatedTrackerAPIClient
+from ...utils import download_geolocations
+
+SIMULATOR_CLIENT = "tumar.animals.simulator.SimulatedTrackerAPIClient"
+BENCHMARK_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark_ingest",
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures download_geolocations against a simulated chinese API: fixes/sec,"
+        " queries per fix and peak memory. Every run is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--farms", type=int, default=1)
+        parser.add_argument("--animals", type=int, default=100, help="Per farm.")
+        parser.add_argument("--fixes", type=int, default=96, help="Per animal.")
+        parser.add_argument("--interval", type=int, default=15, help="Minutes.")
+        parser.add_argument("--jitter", type=float, default=10.0, help="Metres.")
+        parser.add_argument(
+            "--gap-rate", type=float, default=0.0, help="Share of missing fixes."
+        )
+        parser.add_argument("--url-type", type=int, choices=(1, 2), default=1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--runs", type=int, default=3)
+
+    def handle(self, *args, **options):
+        fleet = SimulatedFleet(
+            farms=options["farms"],
+            animals=options["animals"],
+            fixes=options["fixes"],
+            interval_minutes=options["interval"],
+            jitter=options["jitter"],
+            gap_rate=options["gap_rate"],
+            seed=options["seed"],
+        )
+        for farm_id in fleet.get_farm_ids():
+            fleet.get_farm_fixes(farm_id)  # not a part of the measurements
+
+        # no side effects out of the rolled back transaction: the simulated API,
+        # live positions in process, no archived responses, a private cache
+        with override_settings(
+            TRACKER_API_CLIENT=SIMULATOR_CLIENT,
+            LIVE_POSITIONS_BROKER="tumar.animals.live.InProcessBroker",
+            TRACKER_ARCHIVE_DIR="",
+            CACHES=BENCHMARK_CACHES,
+        ):
+            tracker_api._clients[SIMULATOR_CLIENT] = SimulatedTrackerAPIClient(fleet)
+            try:
+                results = [
+                    self.run(fleet, options["url_type"], trace_memory=False)
+                    for _ in range(options["runs"])
+                ]
+                # tracing slows the ingest down, so memory is measured separately
+                peak_memory = self.run(fleet, options["url_type"], trace_memory=True)[
+                    "peak_memory"
+                ]
+            finally:
+                del tracker_api._clients[SIMULATOR_CLIENT]
+
+        fixes = results[0]["fixes"]
+        seconds = statistics.median(result["seconds"] for result in results)
+        queries = results[0]["queries"]
+
+        self.stdout.write(
+            "Farms x animals x fixes: {farms} x {animals} x {fixes}".format(**options)
+        )
+        self.stdout.write("Fixes stored: {}".format(fixes))
+        self.stdout.write(
+            "Time (median of {} runs): {:.3f} s".format(len(results), seconds)
+        )
+        self.stdout.write("Fixes/sec: {:.0f}".format(fixes / seconds if seconds else 0))
+        self.stdout.write(
+            "Queries: {} ({:.4f} per fix)".format(
+                queries, queries / fixes if fixes else 0
+            )
+        )
+        self.stdout.write("Peak memory: {:.1f} MiB".format(peak_memory / 2**20))
+
+    def run(self, fleet, url_type, trace_memory):
+        """
+        Downloads the fixes of all simulated farms in a transaction that is rolled
+        back at the end.
+        """
+        with transaction.atomic():
+            farms = self.create_farms(fleet, url_type)
+
+            if trace_memory:
+                tracemalloc.start()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for the_farm in farms:
+                    download_geolocations(str(the_farm.pk), the_farm.api_key)
+                seconds = time.perf_counter() - started
+
+            peak_memory = None
+            if trace_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            fixes = Geolocation.geolocations.filter(animal__farm__in=farms).count()
+            transaction.set_rollback(True)
+
+        return {
+            "fixes": fixes,
+            "seconds": seconds,
+            "queries": len(queries),
+            "peak_memory": peak_memory,
+        }
+
+    def create_farms(self, fleet, url_type):
+        farms = []
+        for farm_id in fleet.get_farm_ids():
+            the_farm = Farm.objects.create(
+                iin="benchmark-{}".format(farm_id[-8:]),
+                api_key=farm_id,
+                url_type=url_type,
+            )
+            Animal.objects.bulk_create(
+                [Animal(farm=the_farm, imei=imei) for imei in fleet.get_imeis(farm_id)]
+            )
+            farms.append(the_farm)
+        return farms
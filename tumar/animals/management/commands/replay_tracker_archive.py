@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import time
+from datetime import datetime as dt
+
+import django.utils.timezone as tz
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ...archive import find_archived_responses
+from ...ingest import TRACKER_TIMEZONE, TRACKER_TIME_FORMAT
+from ...utils import replay_archived_responses
+
+
+def replay_farm(job):
+    """
+    Runs in a worker process. Responses of a farm are replayed in one process in
+    the order they were received, so that geofence states move forward in time.
+    """
+    farm_pk, paths = job
+    try:
+        return farm_pk, len(paths), replay_archived_responses(farm_pk, paths), None
+    except Exception as e:
+        return farm_pk, len(paths), 0, repr(e)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores the fixes of archived chinese API responses again, without requests"
+        " to the API (e.g. after a parsing fix). Farms are replayed in parallel."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--farm",
+            action="append",
+            dest="farms",
+            default=[],
+            help="Farm id. Can be repeated. All archived farms by default.",
+        )
+        parser.add_argument(
+            "--since",
+            help='Responses received from the time, e.g. "2020-05-01 00:00:00".',
+        )
+        parser.add_argument("--until", help="Responses received before the time.")
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Worker processes, the number of CPUs by default.",
+        )
+
+    def parse_time(self, value):
+        if value is None:
+            return None
+        try:
+            return tz.make_aware(
+                dt.strptime(value, TRACKER_TIME_FORMAT), TRACKER_TIMEZONE
+            )
+        except ValueError:
+            raise CommandError(
+                "Times must be in the {} format.".format(TRACKER_TIME_FORMAT)
+            )
+
+    def handle(self, *args, **options):
+        found = find_archived_responses(
+            options["farms"],
+            self.parse_time(options["since"]),
+            self.parse_time(options["until"]),
+        )
+        if not found:
+            self.stdout.write("No archived responses found.")
+            return
+
+        started = time.monotonic()
+        # workers are forked, they must not share the connection of this process
+        connections.close_all()
+        processes = max(1, min(options["processes"], len(found)))
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            results = pool.imap_unordered(replay_farm, found.items())
+            total_stored = 0
+            failed = 0
+            for farm_pk, responses, stored, error in results:
+                if error is not None:
+                    failed += 1
+                    self.stderr.write("Farm {} failed: {}".format(farm_pk, error))
+                    continue
+                total_stored += stored
+                self.stdout.write(
+                    "Farm {}: {} responses replayed, {} new fixes stored.".format(
+                        farm_pk, responses, stored
+                    )
+                )
+
+        self.stdout.write(
+            "{} farms replayed in {:.1f} s, {} new fixes, {} farms failed.".format(
+                len(found), time.monotonic() - started, total_stored, failed
+            )
+        )
@@ -0,0 +1,64 @@
+from datetime import datetime as dt, timedelta
+
+import django.utils.timezone as tz
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from ...ingest import TRACKER_TIMEZONE, TRACKER_TIME_FORMAT
+from ...models import GeolocationSyncCursor
+
+
+class Command(BaseCommand):
+    help = (
+        "Resets or rewinds geolocation sync cursors, so that the next download"
+        " re-requests older fixes from the chinese API (e.g. for backfills)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--farm",
+            action="append",
+            dest="farms",
+            default=[],
+            help="Farm id. Can be repeated. All farms are affected by default.",
+        )
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument(
+            "--rewind-hours",
+            type=int,
+            help="Move the cursors back by the given number of hours.",
+        )
+        group.add_argument(
+            "--since",
+            help='Set the cursors to the given time, e.g. "2020-05-01 00:00:00".',
+        )
+
+    def handle(self, *args, **options):
+        cursors = GeolocationSyncCursor.objects.all()
+        if options["farms"]:
+            cursors = cursors.filter(farm__in=options["farms"])
+
+        if options["rewind_hours"] is not None:
+            rewind = timedelta(hours=options["rewind_hours"])
+            # an update, so that the counters of a running sync are not overwritten
+            count = cursors.exclude(last_fix_time__isnull=True).update(
+                last_fix_time=F("last_fix_time") - rewind
+            )
+            self.stdout.write("{} cursors are rewound by {}.".format(count, rewind))
+        elif options["since"]:
+            try:
+                since = tz.make_aware(
+                    dt.strptime(options["since"], TRACKER_TIME_FORMAT),
+                    TRACKER_TIMEZONE,
+                )
+            except ValueError:
+                raise CommandError(
+                    "--since must be in the {} format.".format(TRACKER_TIME_FORMAT)
+                )
+            count = cursors.update(last_fix_time=since)
+            self.stdout.write("{} cursors are set to {}.".format(count, since))
+        else:
+            count = cursors.update(last_fix_time=None)
+            self.stdout.write(
+                "{} cursors are reset, full history will be downloaded.".format(count)
+            )
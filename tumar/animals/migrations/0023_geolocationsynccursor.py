@@ -0,0 +1,26 @@
+# Generated by Django 2.2.12 on 2026-10-18 10:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0022_farm_url_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeolocationSyncCursor',
+            fields=[
+                ('farm', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='geolocation_sync_cursor', serialize=False, to='animals.Farm', verbose_name='Farm')),
+                ('last_fix_time', models.DateTimeField(blank=True, null=True, verbose_name='Time of the newest stored fix')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Last updated')),
+            ],
+            options={
+                'verbose_name': 'Geo-location sync cursor',
+                'verbose_name_plural': 'Geo-location sync cursors',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.12 on 2026-10-18 11:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0023_geolocationsynccursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatteryTelemetry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField(verbose_name='Time')),
+                ('voltage', models.DecimalField(decimal_places=3, max_digits=6, verbose_name='Battery charge')),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='battery_telemetry', to='animals.Animal', verbose_name='Animal')),
+            ],
+            options={
+                'verbose_name': 'Battery telemetry',
+                'verbose_name_plural': 'Battery telemetry',
+                'unique_together': {('animal', 'time')},
+            },
+        ),
+    ]
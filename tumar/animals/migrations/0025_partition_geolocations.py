@@ -0,0 +1,119 @@
+# Converts animals_geolocation into a table range-partitioned by month on "time".
+# Requires PostgreSQL 11+ (primary keys, foreign keys and ON CONFLICT on
+# partitioned tables). Further partitions are created by
+# tumar.animals.tasks.task_maintain_geolocation_partitions.
+# The whole table is copied in one transaction that holds an exclusive lock on
+# it, so geolocations can be neither read nor written until the copy is done:
+# stop the web, live and celery services before migrating.
+# The primary key is (id, time), ids are unique because only
+# animals_geolocation_id_seq assigns them, see 0034_geolocation_id_sequence.
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+PARTITION_GEOLOCATIONS_SQL = """
+ALTER TABLE animals_geolocation RENAME TO animals_geolocation_old;
+ALTER SEQUENCE animals_geolocation_id_seq OWNED BY NONE;
+
+CREATE TABLE animals_geolocation (
+    id integer NOT NULL DEFAULT nextval('animals_geolocation_id_seq'),
+    position geometry(Point, 3857) NOT NULL,
+    time timestamp with time zone NOT NULL,
+    animal_id uuid NOT NULL,
+    CONSTRAINT animals_geolocation_id_time_pk PRIMARY KEY (id, time),
+    CONSTRAINT animals_geolocation_animal_id_time_uniq UNIQUE (animal_id, time),
+    CONSTRAINT animals_geolocation_animal_id_fk_animals_animal_id
+        FOREIGN KEY (animal_id) REFERENCES animals_animal (id)
+        DEFERRABLE INITIALLY DEFERRED
+) PARTITION BY RANGE (time);
+
+ALTER SEQUENCE animals_geolocation_id_seq OWNED BY animals_geolocation.id;
+
+CREATE TABLE animals_geolocation_default PARTITION OF animals_geolocation DEFAULT;
+
+DO $$
+DECLARE
+    part_month timestamp := date_trunc(
+        'month',
+        COALESCE((SELECT min(time) FROM animals_geolocation_old), now())
+        AT TIME ZONE 'UTC'
+    );
+    last_month timestamp := date_trunc(
+        'month', (now() + interval '3 months') AT TIME ZONE 'UTC'
+    );
+BEGIN
+    WHILE part_month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF animals_geolocation'
+            ' FOR VALUES FROM (%L) TO (%L)',
+            'animals_geolocation_' || to_char(part_month, 'YYYY_MM'),
+            part_month AT TIME ZONE 'UTC',
+            (part_month + interval '1 month') AT TIME ZONE 'UTC'
+        );
+        part_month := part_month + interval '1 month';
+    END LOOP;
+END $$;
+
+CREATE INDEX animals_geolocation_time_brin
+    ON animals_geolocation USING brin (time);
+CREATE INDEX animals_geolocation_position_gist
+    ON animals_geolocation USING gist (position);
+
+INSERT INTO animals_geolocation (id, position, time, animal_id)
+    SELECT id, position, time, animal_id FROM animals_geolocation_old;
+
+DROP TABLE animals_geolocation_old;
+"""
+
+UNPARTITION_GEOLOCATIONS_SQL = """
+ALTER TABLE animals_geolocation RENAME TO animals_geolocation_partitioned;
+ALTER SEQUENCE animals_geolocation_id_seq OWNED BY NONE;
+
+CREATE TABLE animals_geolocation (
+    id integer NOT NULL DEFAULT nextval('animals_geolocation_id_seq') PRIMARY KEY,
+    position geometry(Point, 3857) NOT NULL,
+    time timestamp with time zone NOT NULL,
+    animal_id uuid NOT NULL REFERENCES animals_animal (id)
+        DEFERRABLE INITIALLY DEFERRED,
+    UNIQUE (animal_id, time)
+);
+
+ALTER SEQUENCE animals_geolocation_id_seq OWNED BY animals_geolocation.id;
+
+CREATE INDEX animals_geolocation_animal_id ON animals_geolocation (animal_id);
+CREATE INDEX animals_geolocation_position_id ON animals_geolocation
+    USING gist (position);
+
+INSERT INTO animals_geolocation (id, position, time, animal_id)
+    SELECT id, position, time, animal_id FROM animals_geolocation_partitioned;
+
+DROP TABLE animals_geolocation_partitioned CASCADE;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0024_batterytelemetry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeolocationHourlySummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='Hour')),
+                ('position', django.contrib.gis.db.models.fields.PointField(srid=3857, verbose_name='Mean position')),
+                ('fixes_count', models.PositiveIntegerField(verbose_name='Number of fixes')),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_geolocations', to='animals.Animal', verbose_name='Animal')),
+            ],
+            options={
+                'verbose_name': 'Hourly geo-location summary',
+                'verbose_name_plural': 'Hourly geo-location summaries',
+                'unique_together': {('animal', 'hour')},
+            },
+        ),
+        migrations.RunSQL(PARTITION_GEOLOCATIONS_SQL, UNPARTITION_GEOLOCATIONS_SQL),
+    ]
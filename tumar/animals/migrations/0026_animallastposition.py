@@ -0,0 +1,36 @@
+# Generated by Django 2.2.12 on 2026-10-18 12:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FILL_LAST_POSITIONS_SQL = """
+INSERT INTO animals_animallastposition (animal_id, position, time)
+    SELECT DISTINCT ON (animal_id) animal_id, position, time
+    FROM animals_geolocation
+    ORDER BY animal_id, time DESC;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0025_partition_geolocations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimalLastPosition',
+            fields=[
+                ('animal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='last_position', serialize=False, to='animals.Animal', verbose_name='Animal')),
+                ('position', django.contrib.gis.db.models.fields.PointField(srid=3857, verbose_name='Position')),
+                ('time', models.DateTimeField(verbose_name='Time')),
+            ],
+            options={
+                'verbose_name': 'Last known position',
+                'verbose_name_plural': 'Last known positions',
+            },
+        ),
+        migrations.RunSQL(FILL_LAST_POSITIONS_SQL, migrations.RunSQL.noop),
+    ]
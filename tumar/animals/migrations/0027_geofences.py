@@ -0,0 +1,47 @@
+# Generated by Django 2.2.12 on 2026-10-18 13:00
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0026_animallastposition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimalGeofenceState',
+            fields=[
+                ('animal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='geofence_state', serialize=False, to='animals.Animal', verbose_name='Animal')),
+                ('cadastres', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='Cadastres')),
+                ('time', models.DateTimeField(verbose_name='Time of the last checked fix')),
+            ],
+            options={
+                'verbose_name': 'Animal geofence state',
+                'verbose_name_plural': 'Animal geofence states',
+            },
+        ),
+        migrations.CreateModel(
+            name='GeofenceEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('EN', 'Зашло на пастбище'), ('EX', 'Покинуло пастбище')], max_length=2, verbose_name='Event type')),
+                ('time', models.DateTimeField(verbose_name='Time')),
+                ('position', django.contrib.gis.db.models.fields.PointField(srid=3857, verbose_name='Position')),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='geofence_events', to='animals.Animal', verbose_name='Animal')),
+                ('cadastre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='geofence_events', to='animals.Cadastre', verbose_name='Cadastre')),
+            ],
+            options={
+                'verbose_name': 'Geofence event',
+                'verbose_name_plural': 'Geofence events',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='geofenceevent',
+            index=models.Index(fields=['animal', 'time'], name='animals_geofence_animal_time'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.12 on 2026-10-18 14:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0027_geofences'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnimalMovementState',
+            fields=[
+                ('animal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='movement_state', serialize=False, to='animals.Animal', verbose_name='Animal')),
+                ('position', django.contrib.gis.db.models.fields.PointField(srid=3857, verbose_name='Position')),
+                ('time', models.DateTimeField(verbose_name='Time')),
+            ],
+            options={
+                'verbose_name': 'Animal movement state',
+                'verbose_name_plural': 'Animal movement states',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyMovementStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('distance', models.FloatField(default=0, verbose_name='Distance (m)')),
+                ('tracked_time', models.PositiveIntegerField(default=0, verbose_name='Tracked time (s)')),
+                ('stationary_time', models.PositiveIntegerField(default=0, verbose_name='Stationary time (s)')),
+                ('max_speed', models.FloatField(default=0, verbose_name='Max speed (m/s)')),
+                ('fixes_count', models.PositiveIntegerField(default=0, verbose_name='Number of fixes')),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movement_stats', to='animals.Animal', verbose_name='Animal')),
+            ],
+            options={
+                'verbose_name': 'Daily movement stats',
+                'verbose_name_plural': 'Daily movement stats',
+                'unique_together': {('animal', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.12 on 2026-10-18 15:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0028_movementstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StayPoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('position', django.contrib.gis.db.models.fields.PointField(srid=3857, verbose_name='Mean position')),
+                ('arrival', models.DateTimeField(verbose_name='Arrival time')),
+                ('departure', models.DateTimeField(verbose_name='Departure time')),
+                ('duration', models.PositiveIntegerField(verbose_name='Duration (s)')),
+                ('fixes_count', models.PositiveIntegerField(verbose_name='Number of fixes')),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stay_points', to='animals.Animal', verbose_name='Animal')),
+                ('cadastre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stay_points', to='animals.Cadastre', verbose_name='Cadastre')),
+            ],
+            options={
+                'verbose_name': 'Stay point',
+                'verbose_name_plural': 'Stay points',
+                'unique_together': {('animal', 'arrival')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.12 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0029_staypoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farm',
+            name='push_enabled',
+            field=models.BooleanField(default=False, help_text='Геолокации приходят через webhook и не запрашиваются по расписанию.', verbose_name='Chinese API pushes geolocations'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.12 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0030_farm_push_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geolocationsynccursor',
+            name='dropped_outliers',
+            field=models.BigIntegerField(default=0, verbose_name='Fixes dropped as GPS outliers'),
+        ),
+        migrations.AddField(
+            model_name='geolocationsynccursor',
+            name='dropped_stationary',
+            field=models.BigIntegerField(default=0, verbose_name='Fixes dropped inside stationary runs'),
+        ),
+    ]
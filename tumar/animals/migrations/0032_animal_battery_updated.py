@@ -0,0 +1,18 @@
+# Generated by Django 2.2.12 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0031_geolocation_filter_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='battery_updated',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Time of the battery charge reading'),
+        ),
+    ]
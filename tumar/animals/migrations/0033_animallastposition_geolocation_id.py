@@ -0,0 +1,27 @@
+# Generated by Django 2.2.12 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+FILL_GEOLOCATION_IDS_SQL = """
+UPDATE animals_animallastposition last
+    SET geolocation_id = geolocation.id
+    FROM animals_geolocation geolocation
+    WHERE geolocation.animal_id = last.animal_id AND geolocation.time = last.time;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0032_animal_battery_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animallastposition',
+            name='geolocation_id',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Geo-location'),
+        ),
+        migrations.RunSQL(FILL_GEOLOCATION_IDS_SQL, migrations.RunSQL.noop),
+    ]
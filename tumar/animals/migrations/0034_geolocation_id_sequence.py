@@ -0,0 +1,29 @@
+# Generated by Django 2.2.12 on 2026-10-18 21:00
+
+from django.db import migrations
+
+
+# The primary key of the partitioned table is (id, time), a unique constraint on
+# id alone is not possible there. Ids are unique because only the sequence
+# assigns them: it must be past every copied id and must never wrap around.
+GEOLOCATION_ID_SEQUENCE_SQL = """
+ALTER SEQUENCE animals_geolocation_id_seq NO CYCLE;
+SELECT setval(
+    'animals_geolocation_id_seq',
+    GREATEST(
+        (SELECT max(id) FROM animals_geolocation),
+        (SELECT last_value FROM animals_geolocation_id_seq)
+    )
+);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('animals', '0033_animallastposition_geolocation_id'),
+    ]
+
+    operations = [
+        migrations.RunSQL(GEOLOCATION_ID_SEQUENCE_SQL, migrations.RunSQL.noop),
+    ]
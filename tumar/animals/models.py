@@ -1,9 +1,8 @@
 import uuid
-import requests
-import json
 
 from django.conf import settings
 from django.contrib.gis.db import models
+from django.contrib.postgres.fields import ArrayField
 from django.db.models import (
     Sum,
     Count,
@@ -19,8 +18,15 @@ from rest_framework.exceptions import ValidationError
 
 from ..users.utils import compress
 from .managers import GeolocationQuerySet, BreedingStockManager, CalfManager
-from .choices import BREED_CHOICES, GENDER_CHOICES, FEMALE, NO_BREED
-from .utils import get_egistic_token
+from .choices import (
+    BREED_CHOICES,
+    GENDER_CHOICES,
+    FEMALE,
+    NO_BREED,
+    GEOFENCE_EVENT_CHOICES,
+)
+from .tracker_api import get_tracker_client
+from .utils import query_egistic_cadastre
 
 
 class Farm(models.Model):
@@ -51,6 +57,13 @@ class Farm(models.Model):
         verbose_name=_("Chinese API URL type"),
         help_text="Возможные варианты 1 и 2.",
     )
+    push_enabled = models.BooleanField(
+        default=False,
+        verbose_name=_("Chinese API pushes geolocations"),
+        help_text=(
+            "Геолокации приходят через webhook и не запрашиваются по расписанию."
+        ),
+    )
 
     @property
     def calf_count(self):
@@ -108,18 +121,9 @@ class Farm(models.Model):
 
     def save(self, *args, **kwargs):
         if self.api_key and len(self.api_key) != 32:
-            url = settings.CHINESE_LOGIN_URL
-            headers = {"Content-type": "application/json", "Accept": "application/json"}
-            payload = {
-                "username": self.api_key,
-                "password": settings.STANDARD_LOGIN_PASSWORD,
-            }
-
-            r = requests.post(url, data=json.dumps(payload), headers=headers)
-
-            if r.status_code != requests.codes.ok:
-                r.raise_for_status()
-            response_data = r.json()
+            response_data = get_tracker_client().login(
+                self.api_key, settings.STANDARD_LOGIN_PASSWORD
+            )
             self.api_key = response_data["data"]["cowfarmList"][0]["id"]
         super(Farm, self).save(*args, **kwargs)  # Call the "real" save() method.
 
@@ -207,6 +211,9 @@ class Animal(BaseAnimal):
         decimal_places=3,
         verbose_name=_("Battery charge"),
     )
+    battery_updated = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("Time of the battery charge reading")
+    )
     updated = models.DateTimeField(default=timezone.now, verbose_name=_("Last updated"))
 
     class Meta:
@@ -215,7 +222,11 @@ class Animal(BaseAnimal):
 
     @property
     def status(self):
-        return self.updated > timezone.now() - timezone.timedelta(days=1)
+        last_seen = self.updated
+        last_position = getattr(self, "last_position", None)
+        if last_position is not None and last_position.time > last_seen:
+            last_seen = last_position.time
+        return last_seen > timezone.now() - timezone.timedelta(days=1)
 
 
 class BreedingStock(BaseAnimal):  # Маточное поголовье
@@ -299,6 +310,12 @@ class StoreCattle(BaseAnimal):  # Скот на откорме
 
 
 class Geolocation(models.Model):
+    """
+    The table is partitioned by month, its primary key is (id, time). Ids are
+    unique because only animals_geolocation_id_seq assigns them, fixes must never
+    be inserted with an explicit id.
+    """
+
     animal = models.ForeignKey(
         Animal,
         on_delete=models.CASCADE,
@@ -322,6 +339,115 @@ class Geolocation(models.Model):
         return str(self.animal.tag_number) + " was at " + str(self.time)
 
 
+class AnimalLastPosition(models.Model):
+    """
+    The newest fix of each animal, maintained by the geolocations ingestion.
+    """
+
+    animal = models.OneToOneField(
+        Animal,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="last_position",
+        verbose_name=_("Animal"),
+    )
+    position = models.PointField(srid=3857, verbose_name=_("Position"))
+    time = models.DateTimeField(verbose_name=_("Time"))
+    # not a foreign key, the geolocations table is partitioned
+    geolocation_id = models.IntegerField(
+        null=True, blank=True, verbose_name=_("Geo-location")
+    )
+
+    class Meta:
+        verbose_name = _("Last known position")
+        verbose_name_plural = _("Last known positions")
+
+    def __str__(self):
+        return str(self.animal) + " was last seen at " + str(self.time)
+
+
+class GeolocationHourlySummary(models.Model):
+    """
+    Hourly rollup of the raw fixes of an animal, kept after the raw fixes expire.
+    """
+
+    animal = models.ForeignKey(
+        Animal,
+        on_delete=models.CASCADE,
+        related_name="hourly_geolocations",
+        verbose_name=_("Animal"),
+    )
+    hour = models.DateTimeField(verbose_name=_("Hour"))
+    position = models.PointField(srid=3857, verbose_name=_("Mean position"))
+    fixes_count = models.PositiveIntegerField(verbose_name=_("Number of fixes"))
+
+    class Meta:
+        unique_together = (
+            "animal",
+            "hour",
+        )
+        verbose_name = _("Hourly geo-location summary")
+        verbose_name_plural = _("Hourly geo-location summaries")
+
+    def __str__(self):
+        return str(self.animal) + " during " + str(self.hour)
+
+
+class BatteryTelemetry(models.Model):
+    animal = models.ForeignKey(
+        Animal,
+        on_delete=models.CASCADE,
+        related_name="battery_telemetry",
+        verbose_name=_("Animal"),
+    )
+    time = models.DateTimeField(verbose_name=_("Time"))
+    voltage = models.DecimalField(
+        max_digits=6, decimal_places=3, verbose_name=_("Battery charge")
+    )
+
+    class Meta:
+        unique_together = (
+            "animal",
+            "time",
+        )
+        verbose_name = _("Battery telemetry")
+        verbose_name_plural = _("Battery telemetry")
+
+    def __str__(self):
+        return str(self.animal) + " had " + str(self.voltage) + " at " + str(self.time)
+
+
+class GeolocationSyncCursor(models.Model):
+    """
+    High-water mark of the geolocations downloaded from the chinese API for a farm.
+    """
+
+    farm = models.OneToOneField(
+        Farm,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="geolocation_sync_cursor",
+        verbose_name=_("Farm"),
+    )
+    last_fix_time = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("Time of the newest stored fix")
+    )
+    dropped_outliers = models.BigIntegerField(
+        default=0, verbose_name=_("Fixes dropped as GPS outliers")
+    )
+    dropped_stationary = models.BigIntegerField(
+        default=0, verbose_name=_("Fixes dropped inside stationary runs")
+    )
+    updated = models.DateTimeField(auto_now=True, verbose_name=_("Last updated"))
+
+    class Meta:
+        verbose_name = _("Geo-location sync cursor")
+        verbose_name_plural = _("Geo-location sync cursors")
+
+    def __str__(self):
+        return str(self.farm) + " synced up to " + str(self.last_fix_time)
+
+
 class Cadastre(models.Model):
     cadastre_num_regex = RegexValidator(
         regex=r"^\d+$",
@@ -362,39 +488,15 @@ class Cadastre(models.Model):
             If the cadastre does not exist in the egistic db, the method returns -1.
             Else returns primary key of the cadastre in the egistic db.
         """
-        url = "{}{}".format(settings.EGISTIC_CADASTRE_QUERY_URL, self.cad_number)
-        token = get_egistic_token()
-        headers = {
-            "Content-type": "application/json",
-            "Accept": "application/json",
-            "Authorization": "Token {}".format(token),
-        }
-
-        r = requests.get(url, headers=headers)
-
-        if r.status_code != requests.codes.ok:
-            r.raise_for_status()
-        response_data = r.json()
+        response_data = query_egistic_cadastre(self.cad_number)
         egistic_cadastre_pk = response_data["id"]
 
         return egistic_cadastre_pk
 
     def save(self, *args, **kwargs):
         if self.cad_number and not self.geom:
-            url = "{}{}".format(settings.EGISTIC_CADASTRE_QUERY_URL, self.cad_number)
-            token = get_egistic_token()
-            headers = {
-                "Content-type": "application/json",
-                "Accept": "application/json",
-                "Authorization": "Token {}".format(token),
-            }
-
-            r = requests.get(url, headers=headers)
-
-            if r.status_code != requests.codes.ok:
-                r.raise_for_status()
-            response_data = r.json()
-            
+            response_data = query_egistic_cadastre(self.cad_number)
+
             if "geomjson" not in response_data:
                 return
 
@@ -408,3 +510,167 @@ class Cadastre(models.Model):
             raise ValidationError("Do not send cad_number and geometry together")
 
         super().save(*args, **kwargs)  # Call the "real" save() method.
+
+
+class GeofenceEvent(models.Model):
+    animal = models.ForeignKey(
+        Animal,
+        on_delete=models.CASCADE,
+        related_name="geofence_events",
+        verbose_name=_("Animal"),
+    )
+    cadastre = models.ForeignKey(
+        Cadastre,
+        on_delete=models.CASCADE,
+        related_name="geofence_events",
+        verbose_name=_("Cadastre"),
+    )
+    event_type = models.CharField(
+        max_length=2, choices=GEOFENCE_EVENT_CHOICES, verbose_name=_("Event type")
+    )
+    time = models.DateTimeField(verbose_name=_("Time"))
+    position = models.PointField(srid=3857, verbose_name=_("Position"))
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["animal", "time"], name="animals_geofence_animal_time")
+        ]
+        verbose_name = _("Geofence event")
+        verbose_name_plural = _("Geofence events")
+
+    def __str__(self):
+        return (
+            str(self.animal)
+            + " "
+            + self.get_event_type_display()
+            + " at "
+            + str(self.time)
+        )
+
+
+class AnimalGeofenceState(models.Model):
+    """
+    Cadastres the animal was inside at its last fix checked against geofences.
+    """
+
+    animal = models.OneToOneField(
+        Animal,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="geofence_state",
+        verbose_name=_("Animal"),
+    )
+    cadastres = ArrayField(
+        models.IntegerField(), default=list, blank=True, verbose_name=_("Cadastres")
+    )
+    time = models.DateTimeField(verbose_name=_("Time of the last checked fix"))
+
+    class Meta:
+        verbose_name = _("Animal geofence state")
+        verbose_name_plural = _("Animal geofence states")
+
+    def __str__(self):
+        return str(self.animal) + " checked at " + str(self.time)
+
+
+class DailyMovementStats(models.Model):
+    """
+    Movement of an animal during a local day, computed from its fixes.
+    """
+
+    animal = models.ForeignKey(
+        Animal,
+        on_delete=models.CASCADE,
+        related_name="movement_stats",
+        verbose_name=_("Animal"),
+    )
+    date = models.DateField(verbose_name=_("Date"))
+    distance = models.FloatField(default=0, verbose_name=_("Distance (m)"))
+    tracked_time = models.PositiveIntegerField(
+        default=0, verbose_name=_("Tracked time (s)")
+    )
+    stationary_time = models.PositiveIntegerField(
+        default=0, verbose_name=_("Stationary time (s)")
+    )
+    max_speed = models.FloatField(default=0, verbose_name=_("Max speed (m/s)"))
+    fixes_count = models.PositiveIntegerField(
+        default=0, verbose_name=_("Number of fixes")
+    )
+
+    class Meta:
+        unique_together = (
+            "animal",
+            "date",
+        )
+        verbose_name = _("Daily movement stats")
+        verbose_name_plural = _("Daily movement stats")
+
+    @property
+    def mean_speed(self):
+        if not self.tracked_time:
+            return 0
+        return self.distance / self.tracked_time
+
+    def __str__(self):
+        return str(self.animal) + " on " + str(self.date)
+
+
+class AnimalMovementState(models.Model):
+    """
+    The last fix of the animal included in its movement stats (the watermark).
+    """
+
+    animal = models.OneToOneField(
+        Animal,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="movement_state",
+        verbose_name=_("Animal"),
+    )
+    position = models.PointField(srid=3857, verbose_name=_("Position"))
+    time = models.DateTimeField(verbose_name=_("Time"))
+
+    class Meta:
+        verbose_name = _("Animal movement state")
+        verbose_name_plural = _("Animal movement states")
+
+    def __str__(self):
+        return str(self.animal) + " processed up to " + str(self.time)
+
+
+class StayPoint(models.Model):
+    """
+    Place where an animal stayed within STAY_POINT_RADIUS for a while.
+    """
+
+    animal = models.ForeignKey(
+        Animal,
+        on_delete=models.CASCADE,
+        related_name="stay_points",
+        verbose_name=_("Animal"),
+    )
+    cadastre = models.ForeignKey(
+        Cadastre,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="stay_points",
+        verbose_name=_("Cadastre"),
+    )
+    date = models.DateField(verbose_name=_("Date"))
+    position = models.PointField(srid=3857, verbose_name=_("Mean position"))
+    arrival = models.DateTimeField(verbose_name=_("Arrival time"))
+    departure = models.DateTimeField(verbose_name=_("Departure time"))
+    duration = models.PositiveIntegerField(verbose_name=_("Duration (s)"))
+    fixes_count = models.PositiveIntegerField(verbose_name=_("Number of fixes"))
+
+    class Meta:
+        unique_together = (
+            "animal",
+            "arrival",
+        )
+        verbose_name = _("Stay point")
+        verbose_name_plural = _("Stay points")
+
+    def __str__(self):
+        return str(self.animal) + " stayed from " + str(self.arrival)
@@ -0,0 +1,189 @@
+import logging
+import django.utils.timezone as tz
+import numpy as np
+
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from psycopg2.extras import execute_values
+
+from .geo import haversine, mercator_to_lonlat
+from .ingest import StoredFix
+from .models import Animal, AnimalMovementState, DailyMovementStats, Geolocation
+
+logger = logging.getLogger()
+
+# Fixes newer than the watermark of their animal, animals without a watermark
+# start from the backfill start
+GET_NEW_FIXES_SQL = """
+    SELECT fix.animal_id, fix.time, ST_X(fix.position), ST_Y(fix.position)
+    FROM {geolocation} fix
+    JOIN {animal} animal ON animal.id = fix.animal_id
+    LEFT JOIN {state} state ON state.animal_id = fix.animal_id
+    WHERE animal.farm_id = %(farm)s
+        AND fix.time > coalesce(state.time, %(backfill_start)s)
+    ORDER BY fix.animal_id, fix.time
+    LIMIT %(limit)s
+""".format(
+    geolocation=Geolocation._meta.db_table,
+    animal=Animal._meta.db_table,
+    state=AnimalMovementState._meta.db_table,
+)
+
+UPSERT_DAILY_STATS_SQL = """
+    INSERT INTO {table} AS stats (
+        animal_id, date, distance, tracked_time, stationary_time, max_speed,
+        fixes_count
+    )
+    VALUES %s
+    ON CONFLICT (animal_id, date) DO UPDATE SET
+        distance = stats.distance + EXCLUDED.distance,
+        tracked_time = stats.tracked_time + EXCLUDED.tracked_time,
+        stationary_time = stats.stationary_time + EXCLUDED.stationary_time,
+        max_speed = greatest(stats.max_speed, EXCLUDED.max_speed),
+        fixes_count = stats.fixes_count + EXCLUDED.fixes_count
+""".format(
+    table=DailyMovementStats._meta.db_table
+)
+
+UPSERT_MOVEMENT_STATES_SQL = """
+    INSERT INTO {table} AS state (animal_id, time, position)
+    VALUES %s
+    ON CONFLICT (animal_id) DO UPDATE
+        SET time = EXCLUDED.time, position = EXCLUDED.position
+""".format(
+    table=AnimalMovementState._meta.db_table
+)
+UPSERT_MOVEMENT_STATES_TEMPLATE = "(%s, %s, ST_SetSRID(ST_MakePoint(%s, %s), 3857))"
+
+# Animal codes and local dates are packed into one integer key
+DATE_KEY_BASE = 10**6
+
+
+def compute_daily_stats(fixes, states):
+    """
+    Computes the movement per animal and local day of the fixes sorted by animal
+    and time. The first segment of an animal starts at its previous fix from
+    `states` (animal_id -> StoredFix). Returns the rows of the stats and the last
+    fix of every animal.
+    """
+    rows = []
+    for i, fix in enumerate(fixes):
+        if i == 0 or fixes[i - 1].animal_id != fix.animal_id:
+            previous = states.get(fix.animal_id)
+            if previous is not None:
+                rows.append((previous, False))
+        rows.append((fix, True))
+
+    animal_codes = {}
+    codes = np.array(
+        [animal_codes.setdefault(fix.animal_id, len(animal_codes)) for fix, _ in rows],
+        dtype=np.int64,
+    )
+    epochs = np.array([fix.time.timestamp() for fix, _ in rows])
+    days = np.array(
+        [tz.localtime(fix.time).date().toordinal() for fix, _ in rows], dtype=np.int64
+    )
+    is_fix = np.array([is_fix for _, is_fix in rows], dtype=bool)
+    lons, lats = mercator_to_lonlat(
+        [fix.x for fix, _ in rows], [fix.y for fix, _ in rows]
+    )
+
+    # Segments between consecutive fixes, counted on the day of their end fix
+    distances = haversine(lons[:-1], lats[:-1], lons[1:], lats[1:])
+    durations = np.diff(epochs)
+    # stationary runs are stored as their first and last fix, longer gaps between
+    # fixes within the radius are rest
+    compressed = distances < settings.GEOLOCATION_STATIONARY_RADIUS
+    valid = (
+        (codes[1:] == codes[:-1])
+        & (durations > 0)
+        & ((durations <= settings.MOVEMENT_MAX_GAP_MINUTES * 60) | compressed)
+    )
+    speeds = np.where(valid, distances / np.maximum(durations, 1), 0)
+    stationary = valid & (speeds < settings.MOVEMENT_STATIONARY_SPEED)
+
+    keys, groups = np.unique(codes * DATE_KEY_BASE + days, return_inverse=True)
+    segment_groups = groups[1:]
+    group_count = len(keys)
+
+    distance = np.bincount(segment_groups, distances * valid, group_count)
+    tracked_time = np.bincount(segment_groups, durations * valid, group_count)
+    stationary_time = np.bincount(segment_groups, durations * stationary, group_count)
+    max_speed = np.zeros(group_count)
+    np.maximum.at(max_speed, segment_groups, speeds)
+    fixes_count = np.bincount(groups, is_fix, group_count)
+
+    animal_ids = list(animal_codes.keys())
+    stats = [
+        (
+            animal_ids[key // DATE_KEY_BASE],
+            date.fromordinal(int(key % DATE_KEY_BASE)),
+            float(distance[i]),
+            int(round(tracked_time[i])),
+            int(round(stationary_time[i])),
+            float(max_speed[i]),
+            int(fixes_count[i]),
+        )
+        for i, key in enumerate(keys.tolist())
+        if fixes_count[i]
+    ]
+    last_fixes = {fix.animal_id: fix for fix in fixes}
+
+    return stats, list(last_fixes.values())
+
+
+def update_farm_movement_stats(farm_pk):
+    """
+    Adds the fixes of the farm animals newer than their watermarks to the daily
+    movement stats, MOVEMENT_STATS_BATCH_SIZE fixes at a time.
+    """
+    backfill_start = tz.now() - timedelta(days=settings.MOVEMENT_STATS_BACKFILL_DAYS)
+    processed = 0
+
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                GET_NEW_FIXES_SQL,
+                {
+                    "farm": farm_pk,
+                    "backfill_start": backfill_start,
+                    "limit": settings.MOVEMENT_STATS_BATCH_SIZE,
+                },
+            )
+            fixes = [StoredFix(*row) for row in cursor.fetchall()]
+
+        if not fixes:
+            break
+
+        states = {
+            state.animal_id: StoredFix(
+                state.animal_id, state.time, state.position.x, state.position.y
+            )
+            for state in AnimalMovementState.objects.filter(
+                animal_id__in={fix.animal_id for fix in fixes}
+            )
+        }
+        stats, last_fixes = compute_daily_stats(fixes, states)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            execute_values(
+                cursor, UPSERT_DAILY_STATS_SQL, stats, page_size=len(stats) or 1
+            )
+            execute_values(
+                cursor,
+                UPSERT_MOVEMENT_STATES_SQL,
+                last_fixes,
+                UPSERT_MOVEMENT_STATES_TEMPLATE,
+                page_size=len(last_fixes),
+            )
+
+        processed += len(fixes)
+        if len(fixes) < settings.MOVEMENT_STATS_BATCH_SIZE:
+            break
+
+    logger.info(
+        "Farm {}: {} fixes added to the movement stats.\n".format(farm_pk, processed)
+    )
+    return processed
@@ -0,0 +1,125 @@
+import logging
+import re
+import pytz
+
+from datetime import datetime as dt
+from dateutil.relativedelta import relativedelta
+
+from django.db import connection, transaction
+
+from .models import Geolocation, GeolocationHourlySummary
+
+logger = logging.getLogger()
+
+PARTITION_NAME_REGEX = re.compile(r"_(\d{4})_(\d{2})$")
+
+GET_PARTITIONS_SQL = """
+    SELECT child.relname
+    FROM pg_inherits
+    JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE parent.relname = %s
+"""
+
+# Rows that were put into the default partition are moved into the new partition
+CREATE_PARTITION_SQL = """
+    CREATE TEMP TABLE moved_geolocations ON COMMIT DROP AS
+        WITH moved AS (
+            DELETE FROM {default} WHERE time >= %(start)s AND time < %(end)s
+            RETURNING *
+        )
+        SELECT * FROM moved;
+    CREATE TABLE {partition} PARTITION OF {table}
+        FOR VALUES FROM (%(start)s) TO (%(end)s);
+    INSERT INTO {table} SELECT * FROM moved_geolocations;
+"""
+
+ROLLUP_PARTITION_SQL = """
+    INSERT INTO {summary} (animal_id, hour, position, fixes_count)
+        SELECT
+            animal_id,
+            date_trunc('hour', time),
+            ST_SetSRID(ST_MakePoint(avg(ST_X(position)), avg(ST_Y(position))), 3857),
+            count(*)
+        FROM {partition}
+        GROUP BY animal_id, date_trunc('hour', time)
+    ON CONFLICT (animal_id, hour) DO NOTHING;
+    ALTER TABLE {table} DETACH PARTITION {partition};
+    DROP TABLE {partition};
+"""
+
+
+def get_month_start(time):
+    return dt(time.year, time.month, 1, tzinfo=pytz.utc)
+
+
+def get_partition_name(month_start):
+    return "{}_{}".format(Geolocation._meta.db_table, month_start.strftime("%Y_%m"))
+
+
+def get_geolocation_partitions():
+    """
+    Returns month start -> name of the monthly partitions of the geolocations table.
+    """
+    partitions = {}
+
+    with connection.cursor() as cursor:
+        cursor.execute(GET_PARTITIONS_SQL, [Geolocation._meta.db_table])
+        for (name,) in cursor.fetchall():
+            match = PARTITION_NAME_REGEX.search(name)
+            if match:
+                year, month = match.groups()
+                partitions[dt(int(year), int(month), 1, tzinfo=pytz.utc)] = name
+
+    return partitions
+
+
+def ensure_geolocation_partitions(months_ahead):
+    """
+    Creates the monthly partitions from the current month up to `months_ahead`
+    months in the future.
+    """
+    table = Geolocation._meta.db_table
+    existing = get_geolocation_partitions()
+    current_month = get_month_start(dt.now(pytz.utc))
+
+    for i in range(months_ahead + 1):
+        month_start = current_month + relativedelta(months=i)
+        if month_start in existing:
+            continue
+
+        partition = get_partition_name(month_start)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                CREATE_PARTITION_SQL.format(
+                    table=table, partition=partition, default=table + "_default"
+                ),
+                {"start": month_start, "end": month_start + relativedelta(months=1)},
+            )
+        logger.info("Geo-locations partition {} is created.\n".format(partition))
+
+
+def rollup_expired_geolocation_partitions(retention_months):
+    """
+    Rolls raw fixes of the partitions older than `retention_months` up into hourly
+    summaries and drops the partitions.
+    """
+    table = Geolocation._meta.db_table
+    current_month = get_month_start(dt.now(pytz.utc))
+    cutoff = current_month - relativedelta(months=retention_months)
+
+    for month_start, partition in sorted(get_geolocation_partitions().items()):
+        if month_start + relativedelta(months=1) > cutoff:
+            break
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                ROLLUP_PARTITION_SQL.format(
+                    summary=GeolocationHourlySummary._meta.db_table,
+                    table=table,
+                    partition=partition,
+                )
+            )
+        logger.info(
+            "Geo-locations partition {} is rolled up and dropped.\n".format(partition)
+        )
@@ -0,0 +1,92 @@
+from rest_framework import renderers
+
+# 1e-5 degrees is about a metre, which is below the accuracy of the trackers
+COORDINATE_PRECISION = 10**5
+
+
+def encode_polyline_value(value, chunks):
+    """
+    Appends a signed integer in the Google encoded polyline format.
+    """
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+
+
+def encode_varint(value, buffer):
+    """
+    Appends a signed integer as a zigzag encoded LEB128 varint.
+    """
+    value = (value << 1) ^ (value >> 63)
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def get_deltas(points):
+    """
+    Yields differences between consecutive (lat, lon, time) points rounded to
+    COORDINATE_PRECISION and seconds, the first point is relative to zeros.
+    """
+    previous = (0, 0, 0)
+    for lat, lon, time in points:
+        current = (
+            int(round(lat * COORDINATE_PRECISION)),
+            int(round(lon * COORDINATE_PRECISION)),
+            int(round(time)),
+        )
+        yield tuple(value - prev for value, prev in zip(current, previous))
+        previous = current
+
+
+class TrajectoryRenderer(renderers.BaseRenderer):
+    """
+    Base of compact trajectory renderers, the data is a list of (lat, lon, unix
+    time) points. Anything else (e.g. errors) is rendered as JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, list):
+            return renderers.JSONRenderer().render(data)
+        return self.encode(data)
+
+    def encode(self, points):
+        raise NotImplementedError("Trajectory renderers must implement encode()")
+
+
+class PolylineRenderer(TrajectoryRenderer):
+    """
+    Google encoded polyline of the points, times are not included.
+    """
+
+    media_type = "application/vnd.google.polyline"
+    format = "polyline"
+    charset = "ascii"
+
+    def encode(self, points):
+        chunks = []
+        for lat, lon, _ in get_deltas(points):
+            encode_polyline_value(lat, chunks)
+            encode_polyline_value(lon, chunks)
+        return "".join(chunks).encode("ascii")
+
+
+class DeltaVarintRenderer(TrajectoryRenderer):
+    """
+    Sequence of zigzag varints: lat and lon in COORDINATE_PRECISION units and
+    unix time in seconds of every point, each as a delta to the previous point.
+    """
+
+    media_type = "application/vnd.tumar.trajectory"
+    format = "delta"
+    charset = None
+
+    def encode(self, points):
+        buffer = bytearray()
+        for delta in get_deltas(points):
+            for value in delta:
+                encode_varint(value, buffer)
+        return bytes(buffer)
@@ -5,9 +5,12 @@ from ..indicators.serializers import ImageryRequestSerializer
 from .models import (
     Farm,
     Animal,
+    AnimalLastPosition,
+    DailyMovementStats,
     Geolocation,
     Machinery,
     Cadastre,
+    StayPoint,
     BreedingStock,
     BreedingBull,
     Calf,
@@ -233,3 +236,50 @@ class GeolocationAnimalSerializer(GeolocationSerializer):
 
     class Meta(GeolocationSerializer.Meta):
         fields = GeolocationSerializer.Meta.fields + ("animal",)
+
+
+class AnimalLastPositionSerializer(serializers.ModelSerializer):
+    # same shape as GeolocationAnimalSerializer, id is the pk of the geolocation
+    id = serializers.ReadOnlyField(source="geolocation_id")
+    animal = AnimalSerializer()
+
+    class Meta:
+        model = AnimalLastPosition
+        fields = (
+            "id",
+            "position",
+            "time",
+            "animal",
+        )
+
+
+class DailyMovementStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailyMovementStats
+        fields = (
+            "id",
+            "animal",
+            "date",
+            "distance",
+            "tracked_time",
+            "stationary_time",
+            "max_speed",
+            "mean_speed",
+            "fixes_count",
+        )
+
+
+class StayPointSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StayPoint
+        fields = (
+            "id",
+            "animal",
+            "cadastre",
+            "date",
+            "position",
+            "arrival",
+            "departure",
+            "duration",
+            "fixes_count",
+        )
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Animal
+from .tiles import invalidate_cluster_tiles
+
+
+@receiver(post_save, sender=Animal)
+@receiver(post_delete, sender=Animal)
+def invalidate_farm_cluster_tiles(sender, instance, **kwargs):
+    # the cluster tiles carry the serialized animals of the farm
+    invalidate_cluster_tiles(instance.farm_id)
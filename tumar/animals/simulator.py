@@ -0,0 +1,153 @@
+from datetime import datetime as dt, timedelta
+
+import numpy as np
+
+import django.utils.timezone as tz
+
+from .geo import EARTH_RADIUS
+from .ingest import TRACKER_TIMEZONE, TRACKER_TIME_FORMAT
+
+
+class SimulatedFleet:
+    """
+    Synthetic farms of trackers moving by random walks. Every farm is generated
+    from its own seed, so the same parameters always give the same fixes.
+    """
+
+    def __init__(
+        self,
+        farms=1,
+        animals=100,
+        fixes=96,
+        interval_minutes=15,
+        jitter=10.0,
+        gap_rate=0.0,
+        seed=0,
+        start=None,
+        center=(76.9, 43.2),
+    ):
+        self.farms = farms
+        self.animals = animals
+        self.fixes = fixes
+        self.interval = timedelta(minutes=interval_minutes)
+        self.jitter = jitter
+        self.gap_rate = gap_rate
+        self.seed = seed
+        self.start = start or tz.make_aware(dt(2020, 1, 1), TRACKER_TIMEZONE)
+        self.center = center
+        self._farm_fixes = {}
+
+    def get_farm_ids(self):
+        # 32 characters, so that saving the farm does not log in to the API
+        return ["{:032x}".format(i + 1) for i in range(self.farms)]
+
+    def get_imeis(self, farm_id):
+        first = (int(farm_id, 16) - 1) * self.animals
+        return ["86{:013d}".format(first + i) for i in range(self.animals)]
+
+    def get_farm_fixes(self, farm_id):
+        """
+        Returns imeis, times and lon/lat degrees of all fixes of the farm as arrays.
+        """
+        if farm_id in self._farm_fixes:
+            return self._farm_fixes[farm_id]
+
+        random = np.random.RandomState(self.seed + int(farm_id, 16))
+        shape = (self.animals, self.fixes)
+
+        # metres from the farm center: herd spread, grazing walk and GPS jitter
+        starts = random.normal(0, 1000, (self.animals, 2, 1))
+        walks = np.cumsum(random.normal(0, 30, (self.animals, 2) + shape[1:]), axis=2)
+        offsets = starts + walks + random.normal(0, self.jitter, walks.shape)
+
+        lats = self.center[1] + np.degrees(offsets[:, 1] / EARTH_RADIUS)
+        lons = self.center[0] + np.degrees(
+            offsets[:, 0] / (EARTH_RADIUS * np.cos(np.radians(self.center[1])))
+        )
+        steps = np.broadcast_to(np.arange(self.fixes), shape)
+        imeis = np.broadcast_to(np.array(self.get_imeis(farm_id))[:, None], shape)
+        kept = random.random_sample(shape) >= self.gap_rate
+
+        self._farm_fixes[farm_id] = (
+            imeis[kept],
+            steps[kept],
+            lons[kept],
+            lats[kept],
+        )
+        return self._farm_fixes[farm_id]
+
+    def get_locations(self, farm_id, begintime, endtime, only_imeis=None):
+        """
+        Location items of the farm between the times in the chinese API format,
+        of the only_imeis trackers if given.
+        """
+        imeis, steps, lons, lats = self.get_farm_fixes(farm_id)
+        items = []
+
+        for imei, step, lon, lat in zip(imeis, steps.tolist(), lons, lats):
+            time = self.start + step * self.interval
+            if only_imeis is not None and str(imei) not in only_imeis:
+                continue
+            if begintime <= time <= endtime:
+                items.append(
+                    {
+                        "imei": str(imei),
+                        "CreateTime": tz.localtime(time, TRACKER_TIMEZONE).strftime(
+                            TRACKER_TIME_FORMAT
+                        ),
+                        "longitude": "{:.6f}".format(lon),
+                        "latitude": "{:.6f}".format(lat),
+                    }
+                )
+
+        return items
+
+    def get_battery_items(self, farm_id):
+        random = np.random.RandomState(self.seed + int(farm_id, 16))
+        lastupdate = tz.localtime(
+            self.start + (self.fixes - 1) * self.interval, TRACKER_TIMEZONE
+        ).strftime(TRACKER_TIME_FORMAT)
+
+        return [
+            {
+                "imei": imei,
+                "lastupdate": lastupdate,
+                "voltage": "{:.3f}".format(voltage),
+                "imsi": "40101{:010d}".format(i),
+            }
+            for i, (imei, voltage) in enumerate(
+                zip(self.get_imeis(farm_id), random.uniform(3.5, 4.2, self.animals))
+            )
+        ]
+
+
+class SimulatedTrackerAPIClient:
+    """
+    Local stand-in of the chinese API that answers from a simulated fleet in the
+    response shapes of both url types.
+    """
+
+    def __init__(self, fleet=None):
+        self.fleet = fleet or SimulatedFleet()
+
+    def login(self, username, password):
+        return {"data": {"cowfarmList": [{"id": self.fleet.get_farm_ids()[0]}]}}
+
+    def get_geolocations(self, url_type, payload):
+        def parse_time(value):
+            return tz.make_aware(
+                dt.strptime(value, TRACKER_TIME_FORMAT), TRACKER_TIMEZONE
+            )
+
+        items = self.fleet.get_locations(
+            payload["farmid"],
+            parse_time(payload["begintime"]),
+            parse_time(payload["endtime"]),
+            {item["imei"] for item in payload["imeis"]},
+        )
+        if url_type == 1:
+            return {"data": items}
+        return {"data": {"data": items}}
+
+    def get_battery_charge(self, external_farm_id):
+        return {"data": self.fleet.get_battery_items(external_farm_id)}
@@ -0,0 +1,139 @@
+import logging
+import django.utils.timezone as tz
+import numpy as np
+
+from datetime import datetime as dt, time as dt_time, timedelta
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import connection, transaction
+
+from .geo import mercator_to_lonlat
+from .geofence import get_fixes_inside
+from .models import Animal, Cadastre, Geolocation, StayPoint
+
+logger = logging.getLogger()
+
+GET_DAY_FIXES_SQL = """
+    SELECT fix.animal_id, fix.time, ST_X(fix.position), ST_Y(fix.position)
+    FROM {geolocation} fix
+    JOIN {animal} animal ON animal.id = fix.animal_id
+    WHERE animal.farm_id = %(farm)s AND fix.time >= %(start)s AND fix.time < %(end)s
+    ORDER BY fix.animal_id, fix.time
+""".format(
+    geolocation=Geolocation._meta.db_table, animal=Animal._meta.db_table
+)
+
+
+def get_stay_ranges(epochs, xs, ys, radius, min_duration, window):
+    """
+    Returns (first, last) fix indices of the stays in the fixes sorted by time.
+    A stay starts at a fix and lasts while the following fixes are within the
+    radius (metres) of it, for at least min_duration seconds. Each fix is compared
+    with up to `window` following fixes at once.
+    """
+    count = len(epochs)
+    if count < 2:
+        return []
+
+    window = min(window, count - 1)
+    offsets = np.arange(1, window + 1)
+    following = np.arange(count)[:, None] + offsets[None, :]
+    exists = following < count
+    following = np.minimum(following, count - 1)
+
+    # EPSG:3857 distances are stretched by 1 / cos(latitude)
+    _, lats = mercator_to_lonlat(xs, ys)
+    scale = np.cos(np.radians(lats))
+    distances = (
+        np.hypot(xs[following] - xs[:, None], ys[following] - ys[:, None])
+        * scale[:, None]
+    )
+    left = (distances > radius) | ~exists
+    # last fix within the radius, the whole window when nothing left it
+    steps = np.where(left.any(axis=1), np.argmax(left, axis=1), window)
+    last = np.arange(count) + steps
+    is_stay = epochs[last] - epochs >= min_duration
+
+    stays = []
+    i = 0
+    while i < count:
+        if is_stay[i]:
+            stays.append((i, int(last[i])))
+            i = int(last[i]) + 1
+        else:
+            i += 1
+    return stays
+
+
+def get_day_bounds(day):
+    start = tz.make_aware(dt.combine(day, dt_time.min))
+    return start, tz.make_aware(dt.combine(day + timedelta(days=1), dt_time.min))
+
+
+def detect_farm_stay_points(farm_pk, day):
+    """
+    Detects the stay points of the farm animals during the local day and replaces
+    the stay points stored for that day.
+    """
+    start, end = get_day_bounds(day)
+    with connection.cursor() as cursor:
+        cursor.execute(GET_DAY_FIXES_SQL, {"farm": farm_pk, "start": start, "end": end})
+        rows = cursor.fetchall()
+
+    stay_points = []
+    first = 0
+    for i in range(1, len(rows) + 1):
+        if i < len(rows) and rows[i][0] == rows[first][0]:
+            continue
+
+        animal_rows = rows[first:i]
+        epochs = np.array([row[1].timestamp() for row in animal_rows])
+        xs = np.array([row[2] for row in animal_rows], dtype=float)
+        ys = np.array([row[3] for row in animal_rows], dtype=float)
+
+        for stay_first, stay_last in get_stay_ranges(
+            epochs,
+            xs,
+            ys,
+            settings.STAY_POINT_RADIUS,
+            settings.STAY_POINT_MIN_DURATION_MINUTES * 60,
+            settings.STAY_POINT_WINDOW,
+        ):
+            stay = slice(stay_first, stay_last + 1)
+            stay_points.append(
+                StayPoint(
+                    animal_id=rows[first][0],
+                    date=day,
+                    position=Point(xs[stay].mean(), ys[stay].mean(), srid=3857),
+                    arrival=animal_rows[stay_first][1],
+                    departure=animal_rows[stay_last][1],
+                    duration=int(epochs[stay_last] - epochs[stay_first]),
+                    fixes_count=stay_last - stay_first + 1,
+                )
+            )
+        first = i
+
+    cadastres = list(
+        Cadastre.objects.filter(farm=farm_pk, geom__isnull=False).only("id", "geom")
+    )
+    if stay_points and cadastres:
+        inside = get_fixes_inside(
+            np.array([stay_point.position.x for stay_point in stay_points]),
+            np.array([stay_point.position.y for stay_point in stay_points]),
+            cadastres,
+        )
+        for stay_point, cadastres_inside in zip(stay_points, inside):
+            if cadastres_inside.any():
+                stay_point.cadastre_id = cadastres[np.argmax(cadastres_inside)].pk
+
+    with transaction.atomic():
+        StayPoint.objects.filter(animal__farm=farm_pk, date=day).delete()
+        StayPoint.objects.bulk_create(stay_points)
+
+    logger.info(
+        "Farm {}: {} stay points detected on {}.\n".format(
+            farm_pk, len(stay_points), day
+        )
+    )
+    return stay_points
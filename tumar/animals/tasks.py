@@ -1,65 +1,167 @@
-import requests
-import django.utils.timezone as tz
-import pytz
-import json
 import logging
+import django.utils.timezone as tz
 
+from datetime import timedelta
 
-from datetime import datetime as dt
 from django.conf import settings
 
-from .models import Farm, Animal
-from .utils import download_geolocations
+from ..notify.models import Notification
+from .archive import prune_archived_responses
+from .movement import update_farm_movement_stats
+from .staypoints import detect_farm_stay_points
+from .models import Farm
+from .partitions import (
+    ensure_geolocation_partitions,
+    rollup_expired_geolocation_partitions,
+)
+from .utils import (
+    download_geolocations,
+    download_battery_percentage,
+    ingest_pushed_geolocations,
+)
 from ..celery import app
 
 logger = logging.getLogger()
 
+# Served by its own worker, whose concurrency limits the parallel syncs
+TRACKER_SYNC_QUEUE = "tumar_tracker_sync"
+
+
+def get_tracker_farms():
+    return Farm.objects.exclude(api_key="").values_list("id", "api_key")
+
+
+def run_farm_sync(sync_func, farm_pk, external_farm_id):
+    """
+    Runs the sync of one farm. Failures are logged, so that they do not affect
+    the other farms.
+    """
+    try:
+        sync_func(farm_pk, external_farm_id)
+    except Exception:
+        logger.exception("{} failed for farm {}.\n".format(sync_func.__name__, farm_pk))
+
 
 @app.task
 def task_download_latest_geolocations():
     """
-    Downloads geolocations from chinese API
+    Dispatches a geolocations download from chinese API for every farm
     """
-    farms_attrs = Farm.objects.values_list("id", "api_key")
-
-    for farm in farms_attrs:
-        if farm[1]:
-            download_geolocations(farm[0], farm[1])
+    for farm_pk, api_key in get_tracker_farms().exclude(push_enabled=True):
+        task_download_farm_geolocations.apply_async(
+            args=(str(farm_pk), api_key), queue=TRACKER_SYNC_QUEUE
+        )
 
 
 @app.task
 def task_download_latest_battery_percentage():
-    farms_attrs = Farm.objects.values_list("id", "api_key")
-
-    for farm in farms_attrs:
-        if farm[1]:
-            url = settings.GET_BATTERY_CHARGE_URL
-            headers = {"Content-type": "application/json", "Accept": "application/json"}
-            payload = {
-                "key": settings.CHINESE_API_KEY,
-                "farmid": farm[1],
-            }
-
-            r = requests.post(url, data=json.dumps(payload), headers=headers)
-
-            if r.status_code != requests.codes.ok:
-                r.raise_for_status()
-            response_data = r.json()
-
-            if not response_data.get("data", None):
-                logger.info("No voltage data for farm {}\n".format(farm[0]))
-                return
-
-            for item in response_data["data"]:
-                if item.get("voltage", None):
-                    my_tz = pytz.timezone("Asia/Almaty")
-                    my_date = dt.strptime(item["lastupdate"], "%Y-%m-%d %H:%M:%S")
-                    time = tz.make_aware(my_date, my_tz)
-
-                    the_animal = Animal.objects.get(imei=item["imei"])
-
-                    if the_animal.updated < time:
-                        the_animal.battery_charge = item["voltage"]
-                        if not the_animal.imsi:
-                            the_animal.imsi = item["imsi"]
-                        the_animal.save()
+    """
+    Dispatches a battery charge download from chinese API for every farm
+    """
+    for farm_pk, api_key in get_tracker_farms():
+        task_download_farm_battery_percentage.apply_async(
+            args=(str(farm_pk), api_key), queue=TRACKER_SYNC_QUEUE
+        )
+
+
+@app.task(
+    soft_time_limit=settings.TRACKER_SYNC_FARM_TIME_LIMIT,
+    time_limit=settings.TRACKER_SYNC_FARM_TIME_LIMIT + 30,
+)
+def task_download_farm_geolocations(farm_pk, external_farm_id):
+    run_farm_sync(download_geolocations, farm_pk, external_farm_id)
+
+
+@app.task(
+    soft_time_limit=settings.TRACKER_SYNC_FARM_TIME_LIMIT,
+    time_limit=settings.TRACKER_SYNC_FARM_TIME_LIMIT + 30,
+)
+def task_download_farm_battery_percentage(farm_pk, external_farm_id):
+    run_farm_sync(download_battery_percentage, farm_pk, external_farm_id)
+
+
+@app.task(
+    bind=True,
+    max_retries=settings.TRACKER_WEBHOOK_LOCK_RETRIES,
+    soft_time_limit=settings.TRACKER_SYNC_FARM_TIME_LIMIT,
+    time_limit=settings.TRACKER_SYNC_FARM_TIME_LIMIT + 30,
+)
+def task_ingest_pushed_geolocations(self, farm_pk, geo_history):
+    try:
+        ingested = ingest_pushed_geolocations(farm_pk, geo_history)
+    except Exception:
+        logger.exception("Pushed geolocations failed for farm {}.\n".format(farm_pk))
+        return
+
+    if ingested:
+        return
+    # a sync of the farm is running, pushed fixes are not skipped but wait for it
+    if self.request.retries >= self.max_retries:
+        logger.error(
+            "Pushed geolocations of farm {} dropped: the farm is locked.\n".format(
+                farm_pk
+            )
+        )
+        return
+    raise self.retry(countdown=settings.TRACKER_WEBHOOK_LOCK_RETRY_SECONDS)
+
+
+@app.task
+def task_prune_tracker_archive():
+    """
+    Deletes archived chinese API responses older than TRACKER_ARCHIVE_RETENTION_DAYS
+    """
+    prune_archived_responses(settings.TRACKER_ARCHIVE_RETENTION_DAYS)
+
+
+@app.task
+def task_maintain_geolocation_partitions():
+    """
+    Creates upcoming monthly geolocation partitions and rolls up expired ones
+    """
+    ensure_geolocation_partitions(settings.GEOLOCATION_PARTITIONS_AHEAD)
+
+    if settings.GEOLOCATION_RETENTION_MONTHS:
+        rollup_expired_geolocation_partitions(settings.GEOLOCATION_RETENTION_MONTHS)
+
+
+@app.task
+def task_update_movement_stats():
+    """
+    Adds new fixes of every farm to the daily movement stats of its animals
+    """
+    for farm_pk, _ in get_tracker_farms():
+        try:
+            update_farm_movement_stats(farm_pk)
+        except Exception:
+            logger.exception("Movement stats failed for farm {}.\n".format(farm_pk))
+
+
+@app.task
+def task_detect_stay_points(days=1):
+    """
+    Detects stay points of every farm for the last `days` local days before today
+    """
+    today = tz.localdate()
+    for farm_pk, _ in get_tracker_farms():
+        for i in range(days, 0, -1):
+            try:
+                detect_farm_stay_points(farm_pk, today - timedelta(days=i))
+            except Exception:
+                logger.exception("Stay points failed for farm {}.\n".format(farm_pk))
+
+
+@app.task(
+    name="send_push_notification.geofence_exit",
+    queue="community_push_notifications",
+)
+def task_send_push_notification_geofence_exit(notification_pk, animal_pk, cadastre_pk):
+    ntfcn = Notification.objects.select_related("receiver").get(pk=notification_pk)
+
+    unread_count = Notification.objects.filter(
+        receiver=ntfcn.receiver, read=False
+    ).count()
+    ntfcn.send(
+        extra={"animal_pk": animal_pk, "cadastre_pk": cadastre_pk},
+        badge=unread_count,
+    )
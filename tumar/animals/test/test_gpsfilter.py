@@ -0,0 +1,91 @@
+from django.test import SimpleTestCase
+from nose.tools import eq_, ok_
+
+from ..gpsfilter import filter_fixes
+
+# about 11 metres of latitude
+STEP = 0.0001
+
+
+def get_track(offsets, animal_id=1, interval=900, lon=71.43, lat=51.13):
+    """
+    Fixes of one animal every `interval` seconds at the latitude offsets in STEPs.
+    """
+    return (
+        [animal_id] * len(offsets),
+        [i * interval for i in range(len(offsets))],
+        [lon] * len(offsets),
+        [lat + offset * STEP for offset in offsets],
+    )
+
+
+def join_tracks(*tracks):
+    return tuple(sum((list(track[i]) for track in tracks), []) for i in range(4))
+
+
+class TestFilterFixes(SimpleTestCase):
+    def test_spike_is_dropped(self):
+        filtered = filter_fixes(*get_track([0, 10, 20, 5000, 30, 40]), max_speed=20)
+        eq_(filtered.keep.tolist(), [True, True, True, False, True, True])
+        eq_(filtered.outliers.sum(), 1)
+
+    def test_fast_segments_without_a_spike_are_kept(self):
+        # the animal moved once, the fixes after the jump stay together
+        filtered = filter_fixes(*get_track([0, 10, 5000, 5010, 5020]), max_speed=20)
+        ok_(filtered.keep.all())
+
+    def test_trailing_spike_is_dropped(self):
+        filtered = filter_fixes(*get_track([0, 10, 20, 4000]), max_speed=20)
+        eq_(filtered.keep.tolist(), [True, True, True, False])
+
+    def test_single_fix_is_checked_against_context(self):
+        animal_ids, epochs, lons, lats = get_track([0, 4000])
+        filtered = filter_fixes(
+            animal_ids, epochs, lons, lats, max_speed=20, context=[True, False]
+        )
+        eq_(filtered.keep.tolist(), [True, False])
+
+    def test_context_is_never_dropped(self):
+        animal_ids, epochs, lons, lats = get_track([0, 5000, 10])
+        filtered = filter_fixes(
+            animal_ids, epochs, lons, lats, max_speed=20, context=[False, True, False]
+        )
+        ok_(filtered.keep[1])
+
+    def test_edges_of_other_animals_are_not_compared(self):
+        filtered = filter_fixes(
+            *join_tracks(get_track([0, 10, 20]), get_track([5000, 5010], animal_id=2)),
+            max_speed=20
+        )
+        ok_(filtered.keep.all())
+
+    def test_stationary_run_keeps_its_first_and_last_fix(self):
+        filtered = filter_fixes(
+            *get_track([0, 0.2, -0.1, 0.1, 0, 50, 100]), stationary_radius=10
+        )
+        eq_(
+            filtered.keep.tolist(),
+            [True, False, False, False, True, True, True],
+        )
+        eq_(filtered.stationary.sum(), 3)
+
+    def test_slow_creep_is_split_at_the_radius(self):
+        # steps of about 4 metres, no fix is farther than 10 metres from its run start
+        filtered = filter_fixes(
+            *get_track([i * 0.4 for i in range(20)]), stationary_radius=10
+        )
+        kept = [i for i, keep in enumerate(filtered.keep.tolist()) if keep]
+        ok_(len(kept) < 20)
+        eq_(kept[0], 0)
+        eq_(kept[-1], 19)
+
+    def test_stationary_runs_do_not_join_animals(self):
+        filtered = filter_fixes(
+            *join_tracks(get_track([0, 0, 0]), get_track([0, 0, 0], animal_id=2)),
+            stationary_radius=10
+        )
+        eq_(filtered.keep.tolist(), [True, False, True, True, False, True])
+
+    def test_disabled_filters_keep_everything(self):
+        filtered = filter_fixes(*get_track([0, 0, 0, 5000, 0]))
+        ok_(filtered.keep.all())
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+import django.utils.timezone as tz
+from django.test import TestCase, override_settings
+from nose.tools import eq_, ok_
+
+from .factories import FarmFactory
+from ..ingest import TRACKER_TIMEZONE, TRACKER_TIME_FORMAT, ingest_geolocations
+from ..models import Geolocation, GeolocationSyncCursor
+from ..utils import advance_sync_cursor
+from ...users.test.factories import UserFactory
+
+
+@override_settings(GEOLOCATION_MAX_SPEED=20.0, GEOLOCATION_STATIONARY_RADIUS=10.0)
+class TestIngestOverlap(TestCase):
+    def setUp(self):
+        self.farm = FarmFactory(user=UserFactory())
+        self.sync_cursor = GeolocationSyncCursor.objects.create(farm=self.farm)
+        start = tz.now().replace(microsecond=0) - timedelta(days=1)
+        # a resting animal, a fix every 10 minutes for 6 hours
+        self.locations = [
+            {
+                "imei": "860000000000001",
+                "CreateTime": tz.localtime(
+                    start + timedelta(minutes=10 * i), TRACKER_TIMEZONE
+                ).strftime(TRACKER_TIME_FORMAT),
+                "longitude": "71.43",
+                "latitude": "51.13",
+            }
+            for i in range(37)
+        ]
+
+    def sync(self, locations):
+        stored = ingest_geolocations(self.farm, locations)
+        advance_sync_cursor(self.sync_cursor, stored)
+        return stored
+
+    def test_overlap_is_not_stored_again(self):
+        first = self.sync(self.locations[:25])
+        eq_(len(first), 2)
+
+        # the next sync downloads the last 2 hours of the previous one again
+        second = self.sync(self.locations[12:])
+        eq_(len(second), 1)
+        ok_(second[0].time > max(fix.time for fix in first))
+
+        eq_(Geolocation.objects.filter(animal__farm=self.farm).count(), 3)
+        self.sync_cursor.refresh_from_db()
+        eq_(self.sync_cursor.dropped_stationary, 34)
+
+    def test_same_overlap_twice(self):
+        self.sync(self.locations[:25])
+        self.sync(self.locations[12:])
+        eq_(self.sync(self.locations[12:]), [])
+
+        eq_(Geolocation.objects.filter(animal__farm=self.farm).count(), 3)
+        self.sync_cursor.refresh_from_db()
+        eq_(self.sync_cursor.dropped_stationary, 34)
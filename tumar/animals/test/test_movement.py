@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+import django.utils.timezone as tz
+from django.test import SimpleTestCase, override_settings
+from nose.tools import eq_
+
+from ..geo import lonlat_to_mercator
+from ..ingest import StoredFix
+from ..movement import compute_daily_stats
+
+# about 11 metres of latitude
+STEP = 0.0001
+
+
+def get_fixes(points, animal_id=1, lon=71.43, lat=51.13):
+    """
+    Fixes of one animal at (minutes, latitude offset in STEPs) points of a day.
+    """
+    start = tz.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    xs, ys = lonlat_to_mercator(
+        [lon] * len(points), [lat + offset * STEP for _, offset in points]
+    )
+    return [
+        StoredFix(animal_id, start + timedelta(minutes=minutes), x, y)
+        for (minutes, _), x, y in zip(points, xs.tolist(), ys.tolist())
+    ]
+
+
+@override_settings(
+    GEOLOCATION_STATIONARY_RADIUS=10.0,
+    MOVEMENT_MAX_GAP_MINUTES=120,
+    MOVEMENT_STATIONARY_SPEED=0.05,
+)
+class TestComputeDailyStats(SimpleTestCase):
+    def test_compressed_rest_is_counted(self):
+        # a stationary run stored as its first and last fix 5 hours apart
+        stats, _ = compute_daily_stats(get_fixes([(0, 0), (300, 0.3)]), {})
+        eq_(len(stats), 1)
+        eq_(stats[0][3], 300 * 60)  # tracked time
+        eq_(stats[0][4], 300 * 60)  # stationary time
+
+    def test_long_gap_of_a_moving_animal_is_not_counted(self):
+        stats, _ = compute_daily_stats(get_fixes([(0, 0), (300, 100)]), {})
+        eq_(stats[0][2], 0)  # distance
+        eq_(stats[0][3], 0)
+
+    def test_short_gaps_are_counted(self):
+        stats, _ = compute_daily_stats(get_fixes([(0, 0), (10, 50), (20, 50.2)]), {})
+        eq_(stats[0][3], 20 * 60)
+        eq_(stats[0][4], 10 * 60)
+        eq_(stats[0][6], 3)  # fixes
+
+    @override_settings(GEOLOCATION_STATIONARY_RADIUS=0)
+    def test_compressed_rest_needs_the_stationary_filter(self):
+        stats, _ = compute_daily_stats(get_fixes([(0, 0), (300, 0)]), {})
+        eq_(stats[0][3], 0)
@@ -0,0 +1,25 @@
+import requests
+from django.test import SimpleTestCase
+from nose.tools import ok_
+
+from ..tracker_api import is_service_failure
+
+
+def get_http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+
+class TestIsServiceFailure(SimpleTestCase):
+    def test_unreachable_service_fails(self):
+        ok_(is_service_failure(requests.ConnectionError()))
+        ok_(is_service_failure(requests.ReadTimeout()))
+
+    def test_server_errors_fail(self):
+        ok_(is_service_failure(get_http_error(502)))
+
+    def test_client_errors_do_not_fail(self):
+        ok_(not is_service_failure(get_http_error(400)))
+        ok_(not is_service_failure(get_http_error(401)))
+        ok_(not is_service_failure(ValueError("No JSON object could be decoded")))
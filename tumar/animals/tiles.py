@@ -0,0 +1,257 @@
+import logging
+import math
+import time
+
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+from django.db import connection
+
+from .clustering import cluster_positions
+from .models import Animal, AnimalLastPosition, Cadastre
+from .serializers import AnimalLastPositionSerializer
+
+logger = logging.getLogger()
+
+WEB_MERCATOR_HALF_SIZE = 20037508.342789244  # metres from the center to the edge
+
+ZOOM_DISTANCE = {
+    11: (30, 7),
+    12: (20, 4),
+    13: (10, 2),
+    14: (5, 0),
+    0: (0, 40),
+}  # (initial query radius, distance bw geolocs)
+PRECOMPUTED_ZOOM_LEVELS = (11, 12, 13, 14)
+
+# Animals go offline without any write, so the tiles are rebuilt at least this often
+CLUSTER_TILES_TIMEOUT = 60 * 10
+
+MVT_CONTENT_TYPE = "application/vnd.mapbox-vector-tile"
+
+# Both layers are clipped to the tile envelope, the pastures with a buffer so that
+# polygon edges do not show up on tile borders
+FARM_TILE_SQL = """
+    WITH bounds AS (
+        SELECT ST_MakeEnvelope(%(minx)s, %(miny)s, %(maxx)s, %(maxy)s, 3857) AS geom
+    ),
+    animals AS (
+        SELECT
+            ST_AsMVTGeom(last.position, bounds.geom) AS geom,
+            animal.id::text AS id,
+            animal.name,
+            animal.tag_number,
+            animal.imei,
+            extract(epoch FROM last.time)::bigint AS time
+        FROM {last_position} last
+        JOIN {animal} animal ON animal.id = last.animal_id
+        CROSS JOIN bounds
+        WHERE animal.farm_id = %(farm)s AND last.position && bounds.geom
+    ),
+    pastures AS (
+        SELECT
+            ST_AsMVTGeom(cadastre.geom, bounds.geom, 4096, 64) AS geom,
+            cadastre.id,
+            cadastre.cad_number,
+            cadastre.title
+        FROM {cadastre} cadastre
+        CROSS JOIN bounds
+        WHERE cadastre.farm_id = %(farm)s AND cadastre.geom && bounds.geom
+    )
+    SELECT
+        coalesce((SELECT ST_AsMVT(animals, 'animals', 4096, 'geom') FROM animals), '')
+        || coalesce(
+            (SELECT ST_AsMVT(pastures, 'pastures', 4096, 'geom') FROM pastures), ''
+        )
+""".format(
+    last_position=AnimalLastPosition._meta.db_table,
+    animal=Animal._meta.db_table,
+    cadastre=Cadastre._meta.db_table,
+)
+
+
+def get_tile_bounds(z, x, y):
+    """
+    Returns (minx, miny, maxx, maxy) of the XYZ tile in EPSG:3857 metres.
+    """
+    tile_size = 2 * WEB_MERCATOR_HALF_SIZE / 2**z
+    minx = -WEB_MERCATOR_HALF_SIZE + x * tile_size
+    maxy = WEB_MERCATOR_HALF_SIZE - y * tile_size
+    return minx, maxy - tile_size, minx + tile_size, maxy
+
+
+def get_zoom_resolution(z):
+    """
+    Returns the size of a pixel of a 256 px XYZ tile in EPSG:3857 metres.
+    """
+    return 2 * WEB_MERCATOR_HALF_SIZE / 256 / 2**z
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= 22 and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def get_tile_xy(z, point_x, point_y):
+    """
+    Returns the (x, y) of the XYZ tile that contains the EPSG:3857 point.
+    """
+    tile_size = 2 * WEB_MERCATOR_HALF_SIZE / 2**z
+    last = 2**z - 1
+    x = math.floor((point_x + WEB_MERCATOR_HALF_SIZE) / tile_size)
+    y = math.floor((WEB_MERCATOR_HALF_SIZE - point_y) / tile_size)
+    return min(max(x, 0), last), min(max(y, 0), last)
+
+
+def get_farm_ingest_version(farm_pk):
+    """
+    Returns the counter that is increased every time new fixes of the farm are
+    stored. It starts from the current timestamp, so that a counter evicted from
+    the cache never comes back to an old value.
+    """
+    key = "farm_ingest_version_{}".format(farm_pk)
+    cache.add(key, int(time.time()), None)
+    return cache.get(key) or 0
+
+
+def bump_farm_ingest_version(farm_pk):
+    key = "farm_ingest_version_{}".format(farm_pk)
+    try:
+        return cache.incr(key)
+    except ValueError:  # the counter is not in the cache
+        return get_farm_ingest_version(farm_pk)
+
+
+def cluster_zoom_positions(positions, zoom_level):
+    """
+    Groups objects with position and time fields for the zoom level.
+    """
+    return cluster_positions(
+        [item.position.x for item in positions],
+        [item.position.y for item in positions],
+        [item.time for item in positions],
+        ZOOM_DISTANCE[int(zoom_level)][1] * 1000,  # km to metres
+    )
+
+
+def get_grouped_items(positions, clusters, serializer_class):
+    """
+    Yields (x, y, kind, data) for each cluster, where kind is "groups" for groups
+    of animals and "animals" for lone animals.
+    """
+    for cluster in clusters:
+        if cluster.count != 1:
+            temp_group_data = {
+                "position": Point(cluster.x, cluster.y).json,
+                "time": cluster.latest_time,
+                "animals_num": cluster.count,
+            }
+            yield cluster.x, cluster.y, "groups", temp_group_data
+        else:
+            item = positions[cluster.members[0]]
+            serializer = serializer_class(item)
+            yield item.position.x, item.position.y, "animals", serializer.data
+
+
+def get_tiles_key(farm_pk, version, zoom_level):
+    return "sgg_{}_{}_{}".format(farm_pk, version, zoom_level)
+
+
+def build_cluster_tiles(farm_pk, version=None):
+    """
+    Clusters the last positions of the farm animals for every precomputed zoom
+    level and puts the results into the cache, one entry per XYZ tile of that zoom.
+    """
+    version = version or get_farm_ingest_version(farm_pk)
+    positions = list(
+        AnimalLastPosition.objects.filter(animal__farm=farm_pk).select_related("animal")
+    )
+
+    for zoom_level in PRECOMPUTED_ZOOM_LEVELS:
+        clusters = cluster_zoom_positions(positions, zoom_level)
+        tiles = {}
+        for x, y, kind, data in get_grouped_items(
+            positions, clusters, AnimalLastPositionSerializer
+        ):
+            tile = tiles.setdefault(
+                get_tile_xy(zoom_level, x, y), {"animals": [], "groups": []}
+            )
+            tile[kind].append(data)
+
+        tiles_key = get_tiles_key(farm_pk, version, zoom_level)
+        cache.set_many(
+            {
+                "{}_{}_{}".format(tiles_key, x, y): tile
+                for (x, y), tile in tiles.items()
+            },
+            CLUSTER_TILES_TIMEOUT,
+        )
+        # the index is written last, so that readers never see missing tiles
+        cache.set(tiles_key, list(tiles.keys()), CLUSTER_TILES_TIMEOUT)
+
+
+def refresh_cluster_tiles(farm_pk):
+    """
+    Called after new fixes of the farm are stored.
+    """
+    build_cluster_tiles(farm_pk, bump_farm_ingest_version(farm_pk))
+
+
+def invalidate_cluster_tiles(farm_pk):
+    """
+    Called after animals of the farm change, the tiles are rebuilt on the next read.
+    """
+    bump_farm_ingest_version(farm_pk)
+
+
+def get_cluster_tiles(farm_pk, zoom_level, bbox=None):
+    """
+    Returns the precomputed animals and groups of the farm for the zoom level,
+    limited to the tiles that intersect the (minx, miny, maxx, maxy) bbox.
+    """
+    version = get_farm_ingest_version(farm_pk)
+    tiles_key = get_tiles_key(farm_pk, version, zoom_level)
+    tile_xys = cache.get(tiles_key)
+
+    if tile_xys is None:
+        build_cluster_tiles(farm_pk, version)
+        tile_xys = cache.get(tiles_key, [])
+
+    if bbox is not None:
+        minx, miny, maxx, maxy = bbox
+        min_tile_x, min_tile_y = get_tile_xy(zoom_level, minx, maxy)
+        max_tile_x, max_tile_y = get_tile_xy(zoom_level, maxx, miny)
+        tile_xys = [
+            (x, y)
+            for x, y in tile_xys
+            if min_tile_x <= x <= max_tile_x and min_tile_y <= y <= max_tile_y
+        ]
+
+    tile_keys = ["{}_{}_{}".format(tiles_key, x, y) for x, y in tile_xys]
+    tiles = cache.get_many(tile_keys)
+
+    if len(tiles) < len(tile_keys):  # some tiles were evicted from the cache
+        build_cluster_tiles(farm_pk, version)
+        tiles = cache.get_many(tile_keys)
+
+    response_json = {"animals": [], "groups": []}
+    for tile in tiles.values():
+        response_json["animals"].extend(tile["animals"])
+        response_json["groups"].extend(tile["groups"])
+
+    return response_json
+
+
+def get_farm_vector_tile(farm_pk, z, x, y):
+    """
+    Returns the Mapbox Vector Tile with the last positions of the farm animals
+    ("animals" layer) and the farm cadastres ("pastures" layer).
+    """
+    minx, miny, maxx, maxy = get_tile_bounds(z, x, y)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            FARM_TILE_SQL,
+            {"minx": minx, "miny": miny, "maxx": maxx, "maxy": maxy, "farm": farm_pk},
+        )
+        tile = cursor.fetchone()[0]
+
+    return bytes(tile or b"")
@@ -0,0 +1,177 @@
+import json
+import logging
+import time
+
+import requests
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .exceptions import TrackerAPIUnavailableError
+
+logger = logging.getLogger()
+
+_clients = {}
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing service for `reset_timeout` seconds after
+    `threshold` consecutive failures. The state lives in the shared cache, so all
+    workers see the same circuit.
+    """
+
+    def __init__(self, name, threshold, reset_timeout):
+        self.failures_key = "{}_circuit_failures".format(name)
+        self.open_key = "{}_circuit_open_until".format(name)
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+
+    def check(self):
+        open_until = cache.get(self.open_key)
+        if open_until is not None and open_until > time.time():
+            raise TrackerAPIUnavailableError(
+                retry_after=int(open_until - time.time()) + 1
+            )
+
+    def record_success(self):
+        cache.delete_many([self.failures_key, self.open_key])
+
+    def record_failure(self):
+        cache.add(self.failures_key, 0, self.reset_timeout)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:  # the counter has just expired
+            failures = 1
+            cache.set(self.failures_key, failures, self.reset_timeout)
+
+        if failures >= self.threshold:
+            logger.error(
+                "The chinese API failed {} times in a row, pausing for {} s.\n".format(
+                    failures, self.reset_timeout
+                )
+            )
+            cache.set(
+                self.open_key, time.time() + self.reset_timeout, self.reset_timeout
+            )
+
+
+def is_service_failure(error):
+    """
+    Connection errors, timeouts and 5xx responses count against the circuit.
+    Client errors such as a bad IMEI or an expired key concern one farm only.
+    """
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code >= 500
+
+
+class TrackerAPIClient:
+    """
+    Client of the chinese tracker API. Keeps pooled keep-alive connections,
+    retries failed requests with exponential backoff and stops calling the API
+    for a while when it keeps failing.
+    """
+
+    def __init__(self):
+        self.timeout = settings.TRACKER_API_TIMEOUT
+        self.breaker = CircuitBreaker(
+            "tracker_api",
+            settings.TRACKER_API_CIRCUIT_THRESHOLD,
+            settings.TRACKER_API_CIRCUIT_RESET_TIMEOUT,
+        )
+
+        retry = Retry(
+            total=settings.TRACKER_API_RETRIES,
+            backoff_factor=settings.TRACKER_API_BACKOFF_FACTOR,
+            status_forcelist=(500, 502, 503, 504),
+            method_whitelist=frozenset(["GET", "POST"]),  # the API only reads on POST
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=settings.TRACKER_API_POOL_SIZE,
+            pool_maxsize=settings.TRACKER_API_POOL_SIZE,
+            max_retries=retry,
+        )
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(
+            {"Content-type": "application/json", "Accept": "application/json"}
+        )
+
+    def post(self, url, payload):
+        self.breaker.check()
+
+        try:
+            r = self.session.post(url, data=json.dumps(payload), timeout=self.timeout)
+            r.raise_for_status()
+            response_data = r.json()
+        except (requests.RequestException, ValueError) as e:
+            if is_service_failure(e):
+                self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        return response_data
+
+    def login(self, username, password):
+        return self.post(
+            settings.CHINESE_LOGIN_URL, {"username": username, "password": password}
+        )
+
+    def get_geolocations(self, url_type, payload):
+        url = (
+            settings.DOWNLOAD_GEOLOCATIONS_URL
+            if url_type == 1
+            else settings.DOWNLOAD_GEOLOCATIONS_URL_2
+        )
+        return self.post(url, payload)
+
+    def get_battery_charge(self, external_farm_id):
+        return self.post(
+            settings.GET_BATTERY_CHARGE_URL,
+            {"key": settings.CHINESE_API_KEY, "farmid": external_farm_id},
+        )
+
+
+class StubTrackerAPIClient:
+    """
+    Local stand-in of the chinese API for tests. Returns the canned responses
+    and remembers the calls that were made.
+    """
+
+    def __init__(self, login=None, geolocations=None, battery_charge=None):
+        self.responses = {
+            "login": login or {"data": {"cowfarmList": []}},
+            "geolocations": geolocations or {"data": []},
+            "battery_charge": battery_charge or {"data": []},
+        }
+        self.calls = []
+
+    def login(self, username, password):
+        self.calls.append(("login", username))
+        return self.responses["login"]
+
+    def get_geolocations(self, url_type, payload):
+        self.calls.append(("geolocations", payload))
+        return self.responses["geolocations"]
+
+    def get_battery_charge(self, external_farm_id):
+        self.calls.append(("battery_charge", external_farm_id))
+        return self.responses["battery_charge"]
+
+
+def get_tracker_client():
+    """
+    Returns the shared client of the class set in TRACKER_API_CLIENT.
+    """
+    client_path = settings.TRACKER_API_CLIENT
+    if client_path not in _clients:
+        _clients[client_path] = import_string(client_path)()
+    return _clients[client_path]
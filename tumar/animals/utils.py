@@ -1,24 +1,90 @@
 import json
-import django.utils.timezone as tz
-import pytz
 import requests
 import logging
+import django.utils.timezone as tz
 
-from datetime import datetime as dt
+from collections import namedtuple
+from datetime import datetime as dt, timedelta
+from urllib.parse import quote
 from dateutil.relativedelta import relativedelta
 from faker import Factory as FakerFactory
 
 from django.conf import settings
-from django.contrib.gis.geos import LineString, Point
-from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.measure import Distance as D
-from django.db.utils import InternalError
+from django.core.cache import cache
+from django.db import connection
+
+from .archive import archive_tracker_response, read_archived_response
+from .locks import farm_lock, single_flight, GEOLOCATIONS_SYNC_LOCK, BATTERY_SYNC_LOCK
+from .tracker_api import get_tracker_client
 
 faker = FakerFactory.create()
 logger = logging.getLogger()
 
+AnimalPath = namedtuple(
+    "AnimalPath", ["geojson", "vertices", "fixes", "start", "end", "points"]
+)
+
+# The path is built in the database, a single fix is returned as a point. Vertices
+# carry the fix time as M, so that simplified paths keep the times of their points
+ANIMAL_PATH_SQL = """
+    WITH path AS ({path_sql}),
+    line AS (
+        SELECT
+            ST_MakeLine(
+                ST_SetSRID(
+                    ST_MakePointM(
+                        ST_X(path.position),
+                        ST_Y(path.position),
+                        extract(epoch FROM path.time)
+                    ),
+                    3857
+                )
+                ORDER BY path.time
+            ) AS geom,
+            count(*) AS fixes,
+            min(path.time) AS start_time,
+            max(path.time) AS end_time
+        FROM path
+    ),
+    simplified AS (
+        SELECT
+            CASE WHEN fixes = 1 THEN ST_StartPoint(geom) ELSE {simplify} END AS geom,
+            fixes,
+            start_time,
+            end_time
+        FROM line
+    )
+    SELECT
+        ST_AsGeoJSON(ST_Force2D(geom)),
+        ST_NPoints(geom),
+        fixes,
+        start_time,
+        end_time,
+        {points}
+    FROM simplified
+"""
+
+# (lat, lon, unix time) of the path vertices
+ANIMAL_PATH_POINTS_SQL = """(
+    SELECT array_agg(
+        ARRAY[ST_Y(point.geom), ST_X(point.geom), ST_M(point.geom)] ORDER BY point.path
+    )
+    FROM ST_DumpPoints(ST_Transform(geom, 4326)) point
+)"""
+
+
+EGISTIC_TOKEN_CACHE_KEY = "egistic_token"
+
+
+def get_egistic_token(refresh=False):
+    """
+    Returns the egistic auth token. The token is cached for EGISTIC_TOKEN_TTL,
+    pass refresh=True to log in again.
+    """
+    token = None if refresh else cache.get(EGISTIC_TOKEN_CACHE_KEY)
+    if token is not None:
+        return token
 
-def get_egistic_token():
     headers = {
         "Content-type": "application/json",
         "Accept": "application/json",
@@ -30,45 +96,144 @@ def get_egistic_token():
     }
 
     r = requests.post(
-        settings.EGISTIC_LOGIN_URL, headers=headers, data=json.dumps(payload)
+        settings.EGISTIC_LOGIN_URL,
+        headers=headers,
+        data=json.dumps(payload),
+        timeout=settings.EGISTIC_TIMEOUT,
     )
 
     if r.status_code != requests.codes.ok:
         r.raise_for_status()
     response_data = r.json()
 
-    return response_data["token"]
+    token = response_data["token"]
+    cache.set(EGISTIC_TOKEN_CACHE_KEY, token, settings.EGISTIC_TOKEN_TTL)
+
+    return token
+
+
+def query_egistic_cadastre(cad_number):
+    """
+    Returns the egistic db record of the cadastre, {"id": ..., "geomjson": ...}.
+    Records are cached for EGISTIC_CADASTRE_CACHE_TTL. Raises requests.HTTPError
+    if the egistic db responds with an error.
+    """
+    key = "egistic_cadastre_{}".format(quote(str(cad_number)))
+    response_data = cache.get(key)
+    if response_data is not None:
+        return response_data
+
+    url = "{}{}".format(settings.EGISTIC_CADASTRE_QUERY_URL, cad_number)
+    headers = {
+        "Content-type": "application/json",
+        "Accept": "application/json",
+        "Authorization": "Token {}".format(get_egistic_token()),
+    }
+
+    r = requests.get(url, headers=headers, timeout=settings.EGISTIC_TIMEOUT)
 
+    if r.status_code == requests.codes.unauthorized:  # the cached token has expired
+        headers["Authorization"] = "Token {}".format(get_egistic_token(refresh=True))
+        r = requests.get(url, headers=headers, timeout=settings.EGISTIC_TIMEOUT)
 
-def get_linestring_from_geolocations(geolocations_qs):
-    return LineString(
-        [geolocation.position for geolocation in geolocations_qs], srid=3857
+    if r.status_code != requests.codes.ok:
+        r.raise_for_status()
+    response_data = r.json()
+
+    cache.set(key, response_data, settings.EGISTIC_CADASTRE_CACHE_TTL)
+
+    return response_data
+
+
+def get_path_from_geolocations(geolocations_qs, tolerance=None, with_points=False):
+    """
+    Returns the path of the geolocations ordered by time as GeoJSON, simplified
+    with ST_Simplify when a tolerance (EPSG:3857 metres) is given. With
+    with_points the (lat, lon, unix time) of the vertices are returned as well.
+    """
+    path_qs = geolocations_qs.values("time", "position")
+    path_sql, params = path_qs.query.sql_with_params()
+    simplify = "geom"
+    if tolerance:
+        simplify = "ST_Simplify(geom, %s, true)"
+        params += (tolerance,)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            ANIMAL_PATH_SQL.format(
+                path_sql=path_sql,
+                simplify=simplify,
+                points=ANIMAL_PATH_POINTS_SQL if with_points else "NULL",
+            ),
+            params,
+        )
+        row = cursor.fetchone()
+
+    if row is None or not row[2]:
+        return None
+    return AnimalPath(*row)
+
+
+def format_tracker_time(time):
+    from .ingest import TRACKER_TIMEZONE, TRACKER_TIME_FORMAT
+
+    return tz.localtime(time, TRACKER_TIMEZONE).strftime(TRACKER_TIME_FORMAT)
+
+
+def get_sync_begintime(sync_cursor):
+    """
+    Start of the download window: the newest stored fix minus a small overlap,
+    so that fixes uploaded late by the trackers are not missed.
+    """
+    if sync_cursor.last_fix_time is None:
+        return settings.GEOLOCATION_SYNC_START
+
+    return format_tracker_time(
+        sync_cursor.last_fix_time
+        - timedelta(minutes=settings.GEOLOCATION_SYNC_OVERLAP_MINUTES)
     )
 
 
+def get_backlog_begintimes(sync_cursor):
+    """
+    Returns IMEI -> start of the download window of the trackers of the farm that
+    went silent before the window of the farm starts, in the last
+    GEOLOCATION_SYNC_BACKLOG_DAYS. Their backlog is downloaded separately, when
+    they come back online, so that the window of the farm is not moved back.
+    """
+    from .models import AnimalLastPosition
+
+    if sync_cursor.last_fix_time is None:
+        return {}
+
+    overlap = timedelta(minutes=settings.GEOLOCATION_SYNC_OVERLAP_MINUTES)
+    silent = AnimalLastPosition.objects.filter(
+        animal__farm=sync_cursor.farm_id,
+        time__gte=tz.now() - timedelta(days=settings.GEOLOCATION_SYNC_BACKLOG_DAYS),
+        time__lt=sync_cursor.last_fix_time - overlap,
+    ).values_list("animal__imei", "time")
+    return {imei: format_tracker_time(time - overlap) for imei, time in silent}
+
+
+@single_flight(GEOLOCATIONS_SYNC_LOCK)
 def download_geolocations(farm_pk, external_farm_id):
-    from .models import Animal, Geolocation, Farm
+    from .models import Farm, GeolocationSyncCursor
+
+    the_farm = Farm.objects.get(pk=farm_pk)
+    sync_cursor, _ = GeolocationSyncCursor.objects.get_or_create(farm=the_farm)
 
     endtime = dt.now() + relativedelta(months=1)
     external_key = settings.CHINESE_API_KEY
 
-    headers = {"Content-type": "application/json", "Accept": "application/json"}
     payload = {
         "key": external_key,
         "farmid": external_farm_id,
-        "begintime": "2018-01-01 00:00:00",
+        "begintime": get_sync_begintime(sync_cursor),
         "endtime": endtime.strftime("%Y-%m-%d %H:%M:%S"),
         "maptype": "2",
         "imeis": [],
     }
 
-    the_farm = Farm.objects.get(pk=farm_pk)
-    url = (
-        settings.DOWNLOAD_GEOLOCATIONS_URL
-        if the_farm.url_type == 1
-        else settings.DOWNLOAD_GEOLOCATIONS_URL_2
-    )
-
     for imei in the_farm.animal_set.all().values_list("imei", flat=True):
         payload["imeis"].append({"imei": str(imei)})
 
@@ -78,103 +243,151 @@ def download_geolocations(farm_pk, external_farm_id):
         )
         return
 
-    r = requests.post(url, data=json.dumps(payload), headers=headers)
+    backlog_begintimes = get_backlog_begintimes(sync_cursor)
+    if not download_geolocations_window(the_farm, sync_cursor, payload):
+        return
 
-    if r.status_code != requests.codes.ok:
-        r.raise_for_status()
-    geo_history = r.json()
-    response_data_list = None
+    # one request per silent tracker, starting at its own last fix
+    for imei, begintime in backlog_begintimes.items():
+        download_geolocations_window(
+            the_farm,
+            sync_cursor,
+            dict(payload, begintime=begintime, imeis=[{"imei": str(imei)}]),
+        )
+
+
+def download_geolocations_window(the_farm, sync_cursor, payload):
+    """
+    Downloads and stores the geolocations of the payload. Returns False when the
+    chinese API responds with an error.
+    """
+    from .ingest import ingest_geolocations
+
+    geo_history = get_tracker_client().get_geolocations(the_farm.url_type, payload)
+    archive_tracker_response(
+        the_farm.pk,
+        the_farm.url_type,
+        geo_history,
+        begintime=payload["begintime"],
+        endtime=payload["endtime"],
+    )
+    response_data_list = get_tracker_locations(
+        the_farm.pk, the_farm.url_type, geo_history
+    )
+    if response_data_list is None:
+        return False
+
+    stored = ingest_geolocations(the_farm, response_data_list)
+    advance_sync_cursor(sync_cursor, stored)
+    return True
+
+
+def ingest_pushed_geolocations(farm_pk, geo_history):
+    """
+    Stores geolocations pushed by the chinese API to the webhook. The payload has
+    the shape of the download response of the farm url type. Fixes are stored
+    under the geolocations sync lock of the farm, returns False without storing
+    them if the lock is held.
+    """
+    from .ingest import ingest_geolocations
+    from .models import Farm, GeolocationSyncCursor
+
+    with farm_lock(
+        GEOLOCATIONS_SYNC_LOCK, farm_pk, settings.TRACKER_SYNC_FARM_TIME_LIMIT + 60
+    ) as acquired:
+        if not acquired:
+            return False
+
+        the_farm = Farm.objects.get(pk=farm_pk)
+        archive_tracker_response(farm_pk, the_farm.url_type, geo_history)
+        response_data_list = get_tracker_locations(
+            farm_pk, the_farm.url_type, geo_history
+        )
+        if not response_data_list:
+            return True
+
+        sync_cursor, _ = GeolocationSyncCursor.objects.get_or_create(farm=the_farm)
+        stored = ingest_geolocations(the_farm, response_data_list)
+        advance_sync_cursor(sync_cursor, stored)
+        return True
+
+
+def replay_archived_responses(farm_pk, paths):
+    """
+    Stores the fixes of archived chinese API responses of the farm again, in the
+    order of the paths. Fixes that are in the database already are skipped.
+    Returns the number of new fixes.
+    """
+    from .ingest import ingest_geolocations
+    from .models import Farm
+
+    the_farm = Farm.objects.get(pk=farm_pk)
+    stored_count = 0
+
+    for path in paths:
+        record = read_archived_response(path)
+        response_data_list = get_tracker_locations(
+            farm_pk, record["url_type"], record["response"]
+        )
+        if response_data_list:
+            stored_count += len(ingest_geolocations(the_farm, response_data_list))
+
+    return stored_count
 
+
+def get_tracker_locations(farm_pk, url_type, geo_history):
+    """
+    Returns location items of the chinese API response of the url type, or None
+    when the response is an error.
+    """
     if "data" not in geo_history:
         logger.info(
             "Error for farm: {} with message: {}\n".format(
                 farm_pk, "Response does not have 'data' parameter"
             )
         )
-        return
+        return None
 
-    if the_farm.url_type == 1:
+    if url_type == 1:
         if geo_history["data"] and "message" in geo_history["data"][0]:
             logger.info(
                 "Error for farm: {} with message: {}\n".format(
                     farm_pk, geo_history["data"][0]["message"]
                 )
             )
-            return
-        response_data_list = geo_history["data"]
-    else:
-        if "message" in geo_history["data"]:
-            logger.info(
-                "Error for farm: {} with message: {}\n".format(
-                    farm_pk, geo_history["data"]["message"]
-                )
-            )
-            return
-        response_data_list = geo_history["data"]["data"]
-
-    for location in response_data_list:
-        my_tz = pytz.timezone("Asia/Almaty")
-        my_date = dt.strptime(location["CreateTime"], "%Y-%m-%d %H:%M:%S")
-
-        try:
-            temp_animal = Animal.objects.get(imei=location["imei"])
-            arguments = dict(animal=temp_animal, time=tz.make_aware(my_date, my_tz),)
-            if not Geolocation.geolocations.filter(**arguments).exists():
-                Geolocation.geolocations.create(
-                    position=Point(
-                        float(location["longitude"]),
-                        float(location["latitude"]),
-                        srid=4326,
-                    ),
-                    **arguments
-                )
-        except Animal.DoesNotExist:
-            temp_animal = Animal.objects.create(farm=the_farm, imei=location["imei"])
-            Geolocation.geolocations.create(
-                animal=temp_animal,
-                position=Point(
-                    float(location["longitude"]), float(location["latitude"]), srid=4326
-                ),
-                time=tz.make_aware(my_date, my_tz),
-            )
-            logger.info(
-                "New animal {} is added, and the corresponding location too.\n",
-                str(temp_animal.pk),
+            return None
+        return geo_history["data"]
+
+    if "message" in geo_history["data"]:
+        logger.info(
+            "Error for farm: {} with message: {}\n".format(
+                farm_pk, geo_history["data"]["message"]
             )
-        except InternalError:
-            logger.info("Wrong Chinese API attributes.\n")
-
-
-def cluster_geolocations(qs_list, zoom_distance, zoom_level):
-    from .models import Geolocation
-
-    groups = []
-    queryset = Geolocation.geolocations.filter(pk__in=qs_list)
-    animal_group_mapping = dict.fromkeys(qs_list)
-    starting_animal_pk = next(iter(animal_group_mapping.keys()))
-    animal_group_mapping[starting_animal_pk] = 0
-    groups.append({starting_animal_pk})
-
-    for unique_animal_pk in animal_group_mapping.keys():
-        if animal_group_mapping[unique_animal_pk] is None:
-            groups.append({unique_animal_pk})
-            animal_group_mapping[unique_animal_pk] = len(groups) - 1
-            current_animal_group = groups[animal_group_mapping[unique_animal_pk]]
-        else:
-            current_animal_group = groups[animal_group_mapping[unique_animal_pk]]
-
-        current_point = queryset.get(pk=unique_animal_pk).position
-        current_animal_group.update(
-            queryset.exclude(pk__in=[pk for group in groups for pk in group])
-            .annotate(distance=Distance("position", current_point))
-            .filter(distance__lt=D(km=zoom_distance[int(zoom_level)][1]))
-            .values_list("pk", flat=True)
-        )
-        animal_group_mapping.update(
-            {pk: animal_group_mapping[unique_animal_pk] for pk in current_animal_group}
         )
+        return None
+    return geo_history["data"]["data"]
+
+
+def advance_sync_cursor(sync_cursor, stored):
+    if not stored:
+        return
+
+    # future-dated fixes of the trackers must not move the window past now
+    newest_fix_time = min(max(fix.time for fix in stored), tz.now())
+    if sync_cursor.last_fix_time is None or sync_cursor.last_fix_time < newest_fix_time:
+        sync_cursor.last_fix_time = newest_fix_time
+        # the dropped fixes counters are updated by the ingest in the meantime
+        sync_cursor.save(update_fields=["last_fix_time", "updated"])
+
+
+@single_flight(BATTERY_SYNC_LOCK)
+def download_battery_percentage(farm_pk, external_farm_id):
+    from .ingest import ingest_battery_telemetry
+
+    response_data = get_tracker_client().get_battery_charge(external_farm_id)
+
+    if not response_data.get("data", None):
+        logger.info("No voltage data for farm {}\n".format(farm_pk))
+        return
 
-    assert (
-        len([item for group in groups for item in group]) == queryset.count()
-    ), "PKs in groups dublicate in another groups"
-    return groups
+    ingest_battery_telemetry(farm_pk, response_data["data"])
@@ -1,33 +1,58 @@
 import datetime
+import hashlib
+import hmac
 import requests
 import json
 import logging
 
 
-from django.core.cache import cache
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.gis.geos import Point, Polygon, GEOSGeometry
+from django.contrib.gis.geos import Point, GEOSGeometry
 from django.contrib.gis.measure import Distance as d
-from django.contrib.gis.db.models import Extent
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.translation import gettext_lazy as _
 from django_filters import rest_framework as filters
 from geopy.geocoders import GeoNames
 from rest_framework import viewsets, status
 from rest_framework.exceptions import NotFound
 from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
 from . import utils
+from .export import EXPORT_FORMATS, stream_trajectory
+from .heatmap import get_cadastre_heatmap
+from .live import stream_farm_positions
+from .tasks import task_ingest_pushed_geolocations, TRACKER_SYNC_QUEUE
+from .renderers import TrajectoryRenderer, PolylineRenderer, DeltaVarintRenderer
+from .locks import get_farm_lock_age, GEOLOCATIONS_SYNC_LOCK, BATTERY_SYNC_LOCK
+from .tiles import (
+    ZOOM_DISTANCE,
+    PRECOMPUTED_ZOOM_LEVELS,
+    MVT_CONTENT_TYPE,
+    get_zoom_resolution,
+    is_valid_tile,
+    get_farm_vector_tile,
+    cluster_zoom_positions,
+    get_cluster_tiles,
+    get_grouped_items,
+)
 from .filters import (
     AnimalPathFilter,
+    DailyMovementStatsFilter,
+    StayPointFilter,
     AnimalNameOrTagNumberFilter,
     AnimalNameTagNumberImeiFilter,
 )
 from .models import (
     Farm,
     Animal,
+    DailyMovementStats,
+    StayPoint,
     Geolocation,
     Machinery,
     Cadastre,
@@ -37,6 +62,8 @@ from .models import (
     StoreCattle,
 )
 from .serializers import (
+    DailyMovementStatsSerializer,
+    StayPointSerializer,
     GeolocationAnimalSerializer,
     AnimalSerializer,
     MachinerySerializer,
@@ -96,7 +123,7 @@ class AnimalViewSet(FilterByUserMixin, viewsets.ModelViewSet):
     Lists, retrieves, creates, and deletes animals
     """
 
-    queryset = Animal.objects.all().order_by("imei")
+    queryset = Animal.objects.select_related("last_position").order_by("imei")
     model = Animal
     serializer_class = AnimalSerializer
     filter_backends = (filters.DjangoFilterBackend,)
@@ -175,11 +202,44 @@ class GeolocationAnimalViewSet(viewsets.ReadOnlyModelViewSet):
     )
 
     def get_queryset(self):
+        queryset = Geolocation.geolocations.select_related("animal__last_position")
+        if self.request.user.is_superuser:
+            return queryset.order_by("animal__imei", "-time")
+        return queryset.filter(animal__farm__user=self.request.user).order_by(
+            "animal__imei", "-time"
+        )
+
+
+class DailyMovementStatsViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Lists daily distance, speed and rest time of the farm animals
+    """
+
+    serializer_class = DailyMovementStatsSerializer
+    filter_backends = (filters.DjangoFilterBackend,)
+    filterset_class = DailyMovementStatsFilter
+
+    def get_queryset(self):
+        queryset = DailyMovementStats.objects.order_by("animal", "-date")
+        if self.request.user.is_superuser:
+            return queryset
+        return queryset.filter(animal__farm__user=self.request.user)
+
+
+class StayPointViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Lists places where the farm animals rested or watered, detected every night
+    """
+
+    serializer_class = StayPointSerializer
+    filter_backends = (filters.DjangoFilterBackend,)
+    filterset_class = StayPointFilter
+
+    def get_queryset(self):
+        queryset = StayPoint.objects.order_by("-arrival")
         if self.request.user.is_superuser:
-            return Geolocation.geolocations.all().order_by("animal__imei", "-time")
-        return Geolocation.geolocations.filter(
-            animal__farm__user=self.request.user
-        ).order_by("animal__imei", "-time")
+            return queryset
+        return queryset.filter(animal__farm__user=self.request.user)
 
 
 class MyFarmView(APIView):
@@ -205,6 +265,155 @@ class ConvertToAdultView(APIView):
         return Response(res_dict)
 
 
+class TrackerSyncLocksView(APIView):
+    """
+    Shows for how many seconds the tracker sync locks of each farm have been held.
+    null means the lock is free.
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        farm_pks = Farm.objects.exclude(api_key="").values_list("pk", flat=True)
+        data = [
+            {
+                "farm": farm_pk,
+                "geolocations_lock_age": get_farm_lock_age(
+                    GEOLOCATIONS_SYNC_LOCK, farm_pk
+                ),
+                "battery_lock_age": get_farm_lock_age(BATTERY_SYNC_LOCK, farm_pk),
+            }
+            for farm_pk in farm_pks
+        ]
+
+        return Response(data)
+
+
+class TrackerWebhookView(APIView):
+    """
+    Geolocations pushed by the chinese API for farms with push_enabled. The body is
+    signed with HMAC-SHA256 of TRACKER_WEBHOOK_SECRET in the X-Tracker-Signature
+    header. Fixes are stored by a task, the request is only acknowledged.
+    """
+
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        if not settings.TRACKER_WEBHOOK_SECRET:
+            raise NotFound()
+
+        signature = hmac.new(
+            settings.TRACKER_WEBHOOK_SECRET.encode(), request.body, hashlib.sha256
+        ).hexdigest()
+        if not hmac.compare_digest(
+            signature, request.META.get("HTTP_X_TRACKER_SIGNATURE", "")
+        ):
+            return Response(
+                {"error": "Invalid signature"}, status=status.HTTP_403_FORBIDDEN
+            )
+
+        try:
+            geo_history = json.loads(request.body.decode())
+            external_farm_id = geo_history["farmid"]
+        except (ValueError, TypeError, KeyError):
+            return Response(
+                {"error": "Invalid payload"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        the_farm = get_object_or_404(
+            Farm.objects.exclude(api_key=""),
+            api_key=external_farm_id,
+            push_enabled=True,
+        )
+
+        data = geo_history.get("data")
+        if the_farm.url_type != 1 and isinstance(data, dict):
+            data = data.get("data")
+        if not isinstance(data, list) or not all(
+            isinstance(item, dict) for item in data
+        ):
+            return Response(
+                {"error": "Invalid payload"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(data) > settings.TRACKER_WEBHOOK_MAX_FIXES:
+            return Response(
+                {"error": "Too many geolocations"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        task_ingest_pushed_geolocations.apply_async(
+            args=(str(the_farm.pk), geo_history), queue=TRACKER_SYNC_QUEUE
+        )
+
+        return Response({"accepted": len(data)}, status=status.HTTP_202_ACCEPTED)
+
+
+class CadastreHeatmapView(APIView):
+    """
+    Grazing density of the cadastre: minutes the farm animals spent in every cell
+    from date_after to date_before (YYYY-MM-DD, the last 30 days by default).
+    Rows of the grid go from north to south.
+    """
+
+    max_days = 366
+
+    def get(self, request, pk):
+        if request.user.is_superuser:
+            cadastre = get_object_or_404(Cadastre, pk=pk, geom__isnull=False)
+        else:
+            cadastre = get_object_or_404(
+                Cadastre, pk=pk, geom__isnull=False, farm__user=request.user
+            )
+
+        try:
+            end_date = datetime.datetime.strptime(
+                request.query_params["date_before"], "%Y-%m-%d"
+            ).date()
+        except KeyError:
+            end_date = datetime.date.today()
+        except ValueError:
+            return Response(
+                {"error": "date_before must be YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            start_date = datetime.datetime.strptime(
+                request.query_params["date_after"], "%Y-%m-%d"
+            ).date()
+        except KeyError:
+            start_date = end_date - datetime.timedelta(days=29)
+        except ValueError:
+            return Response(
+                {"error": "date_after must be YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not 0 <= (end_date - start_date).days < self.max_days:
+            return Response(
+                {"error": "The range must be up to {} days".format(self.max_days)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        spec, heatmap = get_cadastre_heatmap(cadastre, start_date, end_date)
+
+        return Response(
+            {
+                "bbox": (
+                    spec.minx,
+                    spec.miny,
+                    spec.minx + spec.width * spec.cell_size,
+                    spec.miny + spec.height * spec.cell_size,
+                ),
+                "cell_size": spec.cell_size,
+                "width": spec.width,
+                "height": spec.height,
+                "max": int(round(float(heatmap.max()))),
+                "grid": heatmap.T[::-1].round().astype(int).tolist(),
+            }
+        )
+
+
 class SearchCadastreView(APIView):
     """
     Search cadastres by cadastre number in Kazakhstan Cadastre Database
@@ -222,18 +431,10 @@ class SearchCadastreView(APIView):
             "nearest_town": None,
         }
 
-        url = "{}{}".format(settings.EGISTIC_CADASTRE_QUERY_URL, data["cad_number"])
-        token = utils.get_egistic_token()
-        headers = {
-            "Content-type": "application/json",
-            "Accept": "application/json",
-            "Authorization": "Token {}".format(token),
-        }
-
-        r = requests.get(url, headers=headers)
-
-        if r.status_code != requests.codes.ok:
-            if r.status_code == 500:
+        try:
+            response_data = utils.query_egistic_cadastre(data["cad_number"])
+        except requests.HTTPError as e:
+            if e.response.status_code == 500:
                 return Response(
                     {
                         "error": (
@@ -253,7 +454,6 @@ class SearchCadastreView(APIView):
                     status=status.HTTP_404_NOT_FOUND,
                 )
 
-        response_data = r.json()
         data["pk"] = response_data["id"]
         data["geom"] = json.dumps(response_data["geomjson"])
 
@@ -277,17 +477,29 @@ class GetAnimalPathView(APIView):
     View to get the path of an animal between two dates (time included).
     """
 
+    renderer_classes = tuple(api_settings.DEFAULT_RENDERER_CLASSES) + (
+        PolylineRenderer,
+        DeltaVarintRenderer,
+    )
+
     def get(self, request):
         """
         Return a Linestring(GeoJSON) of the path.
 
         url example:
          {baseURL}/api/v1/get-path/?imei=869270046995022&time_before=2019-12-03 00:00:00
+
+        The path is simplified for the map zoom level (zoom) or with the tolerance in
+        metres (tolerance). Vertex count and time range are in X-Path-* headers.
+        Compact encodings are selected with format=polyline|delta or Accept.
         """
         valid_query_params = (
             "imei",
             "time_after",
             "time_before",
+            "tolerance",
+            "zoom",
+            "format",
         )
         queryset = Geolocation.geolocations.all().order_by("time")
 
@@ -299,44 +511,132 @@ class GetAnimalPathView(APIView):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        filtered_data = AnimalPathFilter(request.GET, queryset=queryset)
+        try:
+            tolerance = float(request.query_params.get("tolerance", 0))
+            if "zoom" in request.query_params:
+                tolerance = get_zoom_resolution(int(request.query_params["zoom"]))
+        except ValueError:
+            return Response(
+                {"error": "tolerance must be a number, zoom must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        if filtered_data.qs.count() >= 2:
-            geometry = utils.get_linestring_from_geolocations(filtered_data.qs)
-        else:
-            modified_get = request.GET.copy()
-            if "time_after" not in modified_get and filtered_data.qs.count() < 2:
+        filter_params = request.GET.copy()
+        filter_params.pop("tolerance", None)
+        filter_params.pop("zoom", None)
+        filter_params.pop("format", None)
+        with_points = isinstance(request.accepted_renderer, TrajectoryRenderer)
+
+        filtered_data = AnimalPathFilter(filter_params, queryset=queryset)
+        path = utils.get_path_from_geolocations(
+            filtered_data.qs, tolerance, with_points
+        )
+
+        if path is None or path.fixes < 2:
+            if "time_after" not in filter_params:
                 raise NotFound(
                     detail=_("Not enough geolocations to construct LineString")
                 )
 
-            modified_get.pop("time_after")
-            filtered_data = AnimalPathFilter(modified_get, queryset=queryset)
-            if filtered_data.qs.count() >= 2:
-                geometry = utils.get_linestring_from_geolocations(
-                    filtered_data.qs[filtered_data.qs.count() - 2 :]
+            # the last two geolocations before time_before
+            filter_params.pop("time_after")
+            filtered_data = AnimalPathFilter(filter_params, queryset=queryset)
+            path = utils.get_path_from_geolocations(
+                filtered_data.qs.order_by("-time")[:2], tolerance, with_points
+            )
+            if path is None:
+                raise NotFound(
+                    detail=_("Not enough geolocations to construct LineString")
                 )
-            else:
-                geometry = filtered_data.qs.first().geom.geojson
 
-        return Response(
-            geometry.geojson
-        )  # Any Python primitive is ok, linestring.geojson is str fyi
+        if with_points:
+            response = Response(path.points)
+        else:
+            response = Response(path.geojson)  # linestring.geojson is str fyi
+        response["X-Path-Vertices"] = path.vertices
+        response["X-Path-Fixes"] = path.fixes
+        response["X-Path-Start"] = path.start.isoformat()
+        response["X-Path-End"] = path.end.isoformat()
+        return response
+
+
+class TrajectoryExportView(APIView):
+    """
+    View to stream the geolocations of an animal between two dates as NDJSON or
+    a GeoJSON FeatureCollection (output=ndjson|geojson).
+
+    url example:
+     {baseURL}/api/v1/get-path/export/?imei=869270046995022&output=geojson
+    """
+
+    valid_query_params = ("imei", "time_after", "time_before", "output")
+
+    def get(self, request):
+        if not all(
+            param in self.valid_query_params
+            for param in tuple(request.query_params.keys())
+        ):
+            return Response(
+                {"valid query params": self.valid_query_params},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        export_format = request.query_params.get("output", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"valid outputs": tuple(EXPORT_FORMATS.keys())},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = Geolocation.geolocations.order_by("time")
+        if not request.user.is_superuser:
+            queryset = queryset.filter(animal__farm__user=request.user)
+
+        filtered_data = AnimalPathFilter(request.GET, queryset=queryset)
+        if not filtered_data.is_valid():
+            return Response(filtered_data.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            stream_trajectory(filtered_data.qs, export_format),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        response["Content-Disposition"] = 'attachment; filename="{}.{}"'.format(
+            filtered_data.form.cleaned_data["imei"], export_format
+        )
+        return response
+
+
+class FarmLivePositionsView(APIView):
+    """
+    Server-Sent Events stream of the new positions of the farm animals, so that
+    the map does not poll latest-geolocs. The stream ends every few minutes and
+    clients reconnect. Only served by the gevent processes of the live service,
+    a stream would hold a worker of the API for its whole duration.
+    """
+
+    def get(self, request):
+        if not settings.LIVE_STREAM_ENABLED:
+            raise NotFound()
+
+        the_farm = get_object_or_404(Farm, user=request.user)
+        # the stream does not need the database, streams must not hold connections
+        connection.close()
+
+        response = StreamingHttpResponse(
+            stream_farm_positions(the_farm.pk), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx must not buffer the stream
+        return response
 
 
 class SimpleGroupedGeolocationsView(APIView):
     """
-    View to return latest geolocation for each animal of the farm
+    View to return latest geolocation for each animal of the farm.
+    Optional bbox=minx,miny,maxx,maxy (EPSG:3857) limits the response to the viewport.
     """
 
-    zoom_distance = {
-        11: (30, 7),
-        12: (20, 4),
-        13: (10, 2),
-        14: (5, 0),
-        0: (0, 40),
-    }  # (initial query radius, distance bw geolocs)
-    valid_query_params = ("lon", "lat", "zoom", "user_id")
+    valid_query_params = ("lon", "lat", "zoom", "user_id", "bbox")
 
     def get(self, request):
 
@@ -353,8 +653,6 @@ class SimpleGroupedGeolocationsView(APIView):
         current_user = get_object_or_404(User, pk=user_id)
 
         the_farm = get_object_or_404(Farm, user=current_user)
-        # animal_pks = the_farm.animals.values_list('pk', flat=True)
-        response_json = {"animals": [], "groups": []}
 
         # center_lon = request.query_params.get('lon')
         # center_lat = request.query_params.get('lat')
@@ -362,70 +660,56 @@ class SimpleGroupedGeolocationsView(APIView):
 
         if zoom_level is None or int(zoom_level) < 11:
             zoom_level = 11
+        # closest zoom returns all geolocations
+        zoom_level = min(int(zoom_level), PRECOMPUTED_ZOOM_LEVELS[-1])
+
+        bbox = request.query_params.get("bbox")
+        if bbox is not None:
+            try:
+                minx, miny, maxx, maxy = (float(coord) for coord in bbox.split(","))
+            except ValueError:
+                return Response(
+                    {"error": "bbox must be minx,miny,maxx,maxy in EPSG:3857"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            bbox = (minx, miny, maxx, maxy)
 
-        # Caching
-        key = f"sgg_{the_farm.pk}_{zoom_level}"
-        cached_response = cache.get(key)
-        if cached_response:
-            return Response(cached_response)
-
-        qs = (
-            Geolocation.geolocations.filter(animal__farm=the_farm)
-            .order_by("animal__id", "-time")
-            .distinct("animal__id")
-        )  # latest for each group
-
-        # list(self.zoom_distance.keys())[-1]:  closest zoom returns all geolocations
-        if int(zoom_level) >= 14:
-            serializer = GeolocationAnimalSerializer(qs, many=True)
-            response_json["animals"] = serializer.data
-        else:
-            groups = utils.cluster_geolocations(
-                qs.values_list("pk", flat=True), self.zoom_distance, zoom_level
-            )
-
-            for group in groups:
-                if len(group) != 1:
-                    temp_group_qs = Geolocation.geolocations.filter(pk__in=group)
-                    latest_geoloc_time = (
-                        temp_group_qs.filter(time__isnull=False).latest("time").time
-                    )
-                    group_center_point_bbox = temp_group_qs.aggregate(
-                        Extent("position")
-                    )
-                    group_center_point = Polygon.from_bbox(
-                        group_center_point_bbox["position__extent"]
-                    ).centroid
-                    temp_group_data = {
-                        "position": group_center_point.json,
-                        "time": latest_geoloc_time,
-                        "animals_num": len(group),
-                    }
-                    response_json["groups"].append(temp_group_data)
-                else:
-                    single_animal = Geolocation.geolocations.get(pk=group.pop())
-                    serializer = GeolocationAnimalSerializer(single_animal)
-                    response_json["animals"].append(serializer.data)
-
-        if not cached_response:
-            cache.set(key, response_json, 60 * 10)
+        # Precomputed after every ingest of new fixes of the farm
+        response_json = get_cluster_tiles(the_farm.pk, zoom_level, bbox)
 
         return Response(response_json)
 
 
+class FarmVectorTileView(APIView):
+    """
+    View to return last positions of the farm animals and the farm pastures as a
+    Mapbox Vector Tile. Clients revalidate tiles with If-None-Match.
+    """
+
+    def get(self, request, z, x, y):
+        if not is_valid_tile(z, x, y):
+            raise NotFound(detail=_("The tile does not exist"))
+
+        the_farm = get_object_or_404(Farm, user=request.user)
+        tile = get_farm_vector_tile(the_farm.pk, z, x, y)
+        etag = '"{}"'.format(hashlib.md5(tile).hexdigest())
+
+        if request.META.get("HTTP_IF_NONE_MATCH") == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(tile, content_type=MVT_CONTENT_TYPE)
+
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+
 class LatestGroupedGeolocationsView(APIView):
     """
     View to return groups of points that are near to each other and single lone points.
     This is based on 4 zoom levels.
     """
 
-    zoom_distance = {
-        11: (30, 7),
-        12: (20, 4),
-        13: (10, 2),
-        14: (5, 0),
-        0: (0, 40),
-    }  # (initial query radius, distance bw geolocs)
     valid_query_params = (
         "lon",
         "lat",
@@ -445,7 +729,6 @@ class LatestGroupedGeolocationsView(APIView):
 
         the_farm = get_object_or_404(Farm, user=request.user)
         animal_pks = the_farm.animal_set.values_list("pk", flat=True)
-        response_json = {"animals": [], "groups": []}
 
         if not request.GET:
             """
@@ -467,57 +750,33 @@ class LatestGroupedGeolocationsView(APIView):
                 # time__range=(tz.now() - tz.timedelta(hours=1), tz.now()),
                 position__dwithin=(
                     Point(float(center_lon), float(center_lat), srid=3857),
-                    d(km=self.zoom_distance[int(zoom_level)][0]),
+                    d(km=ZOOM_DISTANCE[int(zoom_level)][0]),
                 ),
             ).order_by("pk")
 
             if (
-                zoom_level == list(self.zoom_distance.keys())[-1]
+                zoom_level == list(ZOOM_DISTANCE.keys())[-1]
             ):  # closest zoom returns all geolocations
                 serializer = GeolocationAnimalSerializer(qs, many=True)
-                response_json["animals"] = serializer.data["results"]
-                return Response(response_json)
+                return Response({"animals": serializer.data, "groups": []})
 
-        groups = utils.cluster_geolocations(qs, self.zoom_distance, zoom_level)
+        positions = list(qs.select_related("animal"))
+        if not positions:
+            return Response({"animals": [], "groups": []})
+
+        clusters = cluster_zoom_positions(positions, zoom_level)
 
         if not request.GET:
-            groups.sort(key=len, reverse=True)
-            biggest_group_count = len(groups[0])
-            biggest_group_qs = Geolocation.geolocations.filter(pk__in=groups[0])
-            groups = utils.cluster_geolocations(
-                biggest_group_qs,
-                self.zoom_distance,
-                next(iter(self.zoom_distance.keys())),
+            biggest_cluster = max(clusters, key=lambda cluster: cluster.count)
+            positions = [positions[i] for i in biggest_cluster.members]
+            clusters = cluster_zoom_positions(
+                positions, next(iter(ZOOM_DISTANCE.keys()))
             )
-            assert (
-                len([item for group in groups for item in group]) == biggest_group_count
-            ), ("PKs must be unique across" " every element in every group.")
-
-        # print(
-        #     "Total animal count: {}, with zoom level: {}".format(
-        #         len([item for group in groups for item in group]), zoom_level
-        #     )
-        # )
-
-        for group in groups:
-            if len(group) != 1:
-                temp_group_qs = Geolocation.geolocations.filter(pk__in=group)
-                latest_geoloc_time = (
-                    temp_group_qs.filter(time__isnull=False).latest("time").time
-                )
-                group_center_point_bbox = temp_group_qs.aggregate(Extent("position"))
-                group_center_point = Polygon.from_bbox(
-                    group_center_point_bbox["position__extent"]
-                ).centroid
-                temp_group_data = {
-                    "position": group_center_point.json,
-                    "time": latest_geoloc_time,
-                    "animals_num": len(group),
-                }
-                response_json["groups"].append(temp_group_data)
-            else:
-                single_animal = Geolocation.geolocations.get(pk=group.pop())
-                serializer = GeolocationAnimalSerializer(single_animal)
-                response_json["animals"].append(serializer.data)
+
+        response_json = {"animals": [], "groups": []}
+        for x, y, kind, data in get_grouped_items(
+            positions, clusters, GeolocationAnimalSerializer
+        ):
+            response_json[kind].append(data)
 
         return Response(response_json)
@@ -35,4 +35,29 @@ app.conf.beat_schedule = {
         "schedule": crontab(minute="*/30"),
         "options": {"queue": "tumar_celerybeat"},
     },
+    "scheduled_movement_stats": {
+        "task": "tumar.animals.tasks.task_update_movement_stats",
+        "schedule": crontab(minute="5,35"),
+        "options": {"queue": "tumar_celerybeat"},
+    },
+    "scheduled_stay_points": {
+        "task": "tumar.animals.tasks.task_detect_stay_points",
+        "schedule": crontab(minute=30, hour=2),
+        "options": {"queue": "tumar_celerybeat"},
+    },
+    "scheduled_pasture_load_events": {
+        "task": "tumar.ecalendar.tasks.task_fill_pasture_load_events",
+        "schedule": crontab(minute=0, hour=6),
+        "options": {"queue": "tumar_celerybeat"},
+    },
+    "scheduled_geolocation_partitions": {
+        "task": "tumar.animals.tasks.task_maintain_geolocation_partitions",
+        "schedule": crontab(minute=0, hour=3),
+        "options": {"queue": "tumar_celerybeat"},
+    },
+    "scheduled_tracker_archive_pruning": {
+        "task": "tumar.animals.tasks.task_prune_tracker_archive",
+        "schedule": crontab(minute=30, hour=3),
+        "options": {"queue": "tumar_celerybeat"},
+    },
 }
@@ -201,9 +201,101 @@ class Common(Configuration):
     EGISTIC_USERNAME = config("EGISTIC_USERNAME")
     EGISTIC_PASSWORD = config("EGISTIC_PASSWORD")
     STANDARD_LOGIN_PASSWORD = config("STANDARD_LOGIN_PASSWORD")
+    EGISTIC_TIMEOUT = (5, 30)  # seconds to connect, seconds to read
+    EGISTIC_TOKEN_TTL = 60 * 60
+    EGISTIC_CADASTRE_CACHE_TTL = 60 * 60 * 24
 
     DAYS_BETWEEN_IMAGERY_REQUESTS = 5
 
+    # Tracker geolocations ingestion
+    GEOLOCATION_INGEST_CHUNK_SIZE = config(
+        "GEOLOCATION_INGEST_CHUNK_SIZE", default=1000, cast=int
+    )
+    GEOLOCATION_PARTITIONS_AHEAD = 3  # months
+    # Older raw fixes are rolled up into hourly summaries, 0 keeps them forever
+    GEOLOCATION_RETENTION_MONTHS = config(
+        "GEOLOCATION_RETENTION_MONTHS", default=0, cast=int
+    )
+    GEOLOCATION_SYNC_START = "2018-01-01 00:00:00"
+    GEOLOCATION_SYNC_OVERLAP_MINUTES = config(
+        "GEOLOCATION_SYNC_OVERLAP_MINUTES", default=120, cast=int
+    )
+    # Trackers silent for fewer days than this get their backlog downloaded in a
+    # request of their own when they come back online
+    GEOLOCATION_SYNC_BACKLOG_DAYS = config(
+        "GEOLOCATION_SYNC_BACKLOG_DAYS", default=3, cast=int
+    )
+    # Fixes are filtered before they are stored, 0 disables a filter. GPS spikes
+    # faster than the speed (m/s) are dropped, runs of fixes within the radius
+    # (metres) keep their first and last fix only
+    GEOLOCATION_MAX_SPEED = config("GEOLOCATION_MAX_SPEED", default=20.0, cast=float)
+    GEOLOCATION_STATIONARY_RADIUS = config(
+        "GEOLOCATION_STATIONARY_RADIUS", default=10.0, cast=float
+    )
+    # Raw chinese API responses are archived gzipped for replays, "" disables it.
+    # Files older than the retention are deleted every night
+    TRACKER_ARCHIVE_DIR = config("TRACKER_ARCHIVE_DIR", default="")
+    TRACKER_ARCHIVE_RETENTION_DAYS = config(
+        "TRACKER_ARCHIVE_RETENTION_DAYS", default=30, cast=int
+    )
+    # Rows fetched per round trip of the server-side cursor of trajectory exports
+    GEOLOCATION_EXPORT_CHUNK_SIZE = 2000
+
+    # Farmers are notified of animals leaving pastures in fixes up to this old
+    GEOFENCE_NOTIFY_MAX_AGE_MINUTES = 60
+
+    # Daily movement stats of animals
+    MOVEMENT_STATS_BATCH_SIZE = 50000  # fixes per query
+    MOVEMENT_STATS_BACKFILL_DAYS = 30  # history processed for animals seen first
+    MOVEMENT_STATIONARY_SPEED = 0.05  # m/s, slower segments are resting
+    # longer gaps between fixes are not counted, unless they are compressed rest
+    MOVEMENT_MAX_GAP_MINUTES = 120
+
+    # Stay points: consecutive fixes within the radius for the minimum duration
+    STAY_POINT_RADIUS = 50  # metres
+    STAY_POINT_MIN_DURATION_MINUTES = 30
+    STAY_POINT_WINDOW = 288  # max fixes compared with each fix
+
+    # Grazing density heatmaps of cadastres
+    HEATMAP_CELL_SIZE = 50  # metres
+    HEATMAP_MAX_CELLS = 256  # per side, larger cadastres get larger cells
+    HEATMAP_CACHE_TIMEOUT = 60 * 60 * 24 * 30  # grids of past days
+    HEATMAP_TODAY_CACHE_TIMEOUT = 60 * 15
+    HEATMAP_MAX_GAP_MINUTES = 12 * 60  # a fix weighs up to this, trackers go silent
+    PASTURE_LOAD_DAYS = 30  # period of the pasture load analysis
+
+    # Live positions stream, the in-process broker does not reach other processes.
+    # Streams hold their worker, so they are served only by processes that set
+    # LIVE_STREAM_ENABLED (the gevent uwsgi of config/uwsgi_live.ini)
+    LIVE_POSITIONS_BROKER = config(
+        "LIVE_POSITIONS_BROKER", default="tumar.animals.live.InProcessBroker"
+    )
+    LIVE_STREAM_ENABLED = config("LIVE_STREAM_ENABLED", default=False, cast=bool)
+    LIVE_STREAM_MAX_SECONDS = 300
+    LIVE_STREAM_HEARTBEAT_SECONDS = 15
+    LIVE_STREAM_RETRY_MILLISECONDS = 5000
+
+    # Per-farm tracker sync tasks
+    TRACKER_SYNC_FARM_TIME_LIMIT = config(
+        "TRACKER_SYNC_FARM_TIME_LIMIT", default=5 * 60, cast=int
+    )  # seconds
+
+    # Chinese tracker API client
+    TRACKER_API_CLIENT = "tumar.animals.tracker_api.TrackerAPIClient"
+    TRACKER_API_TIMEOUT = (5, 60)  # seconds to connect, seconds to read
+    TRACKER_API_RETRIES = 3
+    TRACKER_API_BACKOFF_FACTOR = 1  # waits 0, 2, 4... seconds between retries
+    TRACKER_API_POOL_SIZE = 10
+    TRACKER_API_CIRCUIT_THRESHOLD = 5
+    TRACKER_API_CIRCUIT_RESET_TIMEOUT = 5 * 60  # seconds
+
+    # Geolocations pushed by the chinese API, requests are signed with the secret
+    TRACKER_WEBHOOK_SECRET = config("TRACKER_WEBHOOK_SECRET", default="")
+    TRACKER_WEBHOOK_MAX_FIXES = 10000  # per request
+    # Pushed fixes wait for a running sync of the farm, retried up to 10 minutes
+    TRACKER_WEBHOOK_LOCK_RETRY_SECONDS = 30
+    TRACKER_WEBHOOK_LOCK_RETRIES = 20
+
     CACHES = {
         "default": {
             "BACKEND": "django.core.cache.backends.memcached.MemcachedCache",
@@ -22,6 +22,12 @@ class Production(Common):
         "default": config("TUMAR_DB", cast=db_url),
     }
 
+    # Live positions are shared between the celery workers and the live service
+    LIVE_POSITIONS_BROKER = "tumar.animals.live.RedisBroker"
+    LIVE_POSITIONS_REDIS_URL = config(
+        "LIVE_POSITIONS_REDIS_URL", default="redis://redis:6379/0"
+    )
+
     # CELERY SETTIGS
     CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="rpc://")
     CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND", default="rpc://")
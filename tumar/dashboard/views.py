@@ -1,7 +1,11 @@
+from django.db.models import Avg, Max, Sum
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from ..animals.models import DailyMovementStats
+
 # Create your views here.
 
 
@@ -118,3 +122,33 @@ class CowCountByYearView(APIView):
         # ] = the_farm.breedingstock_set.get_cows_count_by_year_range(5, 9)
 
         return Response(response_data, status=status.HTTP_200_OK)
+
+
+class HerdMovementAverageView(APIView):
+    def get(self, request):
+        the_farm = request.user.farm
+        week_ago = timezone.localdate() - timezone.timedelta(days=7)
+
+        stats = DailyMovementStats.objects.filter(
+            animal__farm=the_farm, date__gt=week_ago
+        ).aggregate(
+            distance=Avg("distance"),
+            max_speed=Max("max_speed"),
+            stationary_time=Avg("stationary_time"),
+            total_distance=Sum("distance"),
+            tracked_time=Sum("tracked_time"),
+        )
+
+        try:
+            mean_speed = stats["total_distance"] / stats["tracked_time"] * 3.6
+        except (ZeroDivisionError, TypeError):
+            mean_speed = 0
+
+        response_data = {
+            "Среднесуточный пробег (км)": (stats["distance"] or 0) / 1000,
+            "Средняя скорость (км/ч)": mean_speed,
+            "Максимальная скорость (км/ч)": (stats["max_speed"] or 0) * 3.6,
+            "Время отдыха в сутки (ч)": (stats["stationary_time"] or 0) / 3600,
+        }
+
+        return Response(response_data, status=status.HTTP_200_OK)
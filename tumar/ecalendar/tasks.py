@@ -0,0 +1,70 @@
+import logging
+import django.utils.timezone as tz
+
+from datetime import timedelta
+
+from django.conf import settings
+
+from ..animals.heatmap import get_pasture_load
+from ..celery import app
+from .models import BreedingStockEvent, SingleBreedingStockEvent
+
+logger = logging.getLogger()
+
+PASTURE_LOAD_EVENT_TITLE = "Анализ нагрузки на пастбище"
+
+
+def get_pasture_load_report(loads, start_date, end_date):
+    lines = ["Нагрузка на пастбища с {} по {}:".format(start_date, end_date)]
+    for load in loads:
+        lines.append(
+            "{}: использовано {:.0f}% площади, {} часов выпаса животных".format(
+                load["title"], load["grazed_share"] * 100, load["animal_hours"]
+            )
+        )
+    return "\n".join(lines)
+
+
+def fill_pasture_load_event(event, today):
+    """
+    Completes the event with the grazing density of the farm cadastres for the
+    last PASTURE_LOAD_DAYS days.
+    """
+    start_date = today - timedelta(days=settings.PASTURE_LOAD_DAYS - 1)
+    loads = [
+        get_pasture_load(cadastre, start_date, today)
+        for cadastre in event.farm.cadastres.filter(geom__isnull=False)
+    ]
+    if not loads:
+        return
+
+    event.report = get_pasture_load_report(loads, start_date, today)
+    event.save(update_fields=["report"])
+    SingleBreedingStockEvent.objects.filter(event=event, completed=False).update(
+        completed=True, completion_date=today, attributes={"pasture_load": loads}
+    )
+
+
+@app.task
+def task_fill_pasture_load_events():
+    """
+    Fills started pasture load analysis events with real grazing data
+    """
+    today = tz.localdate()
+    events = (
+        BreedingStockEvent.objects.filter(
+            title=PASTURE_LOAD_EVENT_TITLE,
+            scheduled_date_range__startswith__lte=today,
+            singlebreedingstockevent__completed=False,
+        )
+        .select_related("farm")
+        .distinct()
+    )
+
+    for event in events:
+        try:
+            fill_pasture_load_event(event, today)
+        except Exception:
+            logger.exception(
+                "Pasture load analysis failed for event {}.\n".format(event.pk)
+            )
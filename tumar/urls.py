@@ -13,18 +13,26 @@ from push_notifications.api.rest_framework import GCMDeviceAuthorizedViewSet, AP
 from .animals.views import (
     FarmViewSet,
     GeolocationAnimalViewSet,
+    DailyMovementStatsViewSet,
+    StayPointViewSet,
     AnimalViewSet,
     GetAnimalPathView,
+    TrajectoryExportView,
     MachineryViewSet,
     CadastreViewSet,
     MyFarmView,
     SearchCadastreView,
+    CadastreHeatmapView,
     SimpleGroupedGeolocationsView,
+    FarmLivePositionsView,
+    FarmVectorTileView,
     BreedingStockViewSet,
     BreedingBullViewSet,
     CalfViewSet,
     StoreCattleViewSet,
     ConvertToAdultView,
+    TrackerSyncLocksView,
+    TrackerWebhookView,
 )
 from .users.views import (
     UserViewSet,
@@ -69,6 +77,7 @@ from .dashboard.views import (
     CowEffectivenessAverageView,
     CowSKTAverageView,
     CowCountByYearView,
+    HerdMovementAverageView,
 )
 from .notify.views import NotificationListView, NotificationMarkAsReadView
 from .usersupport.views import SupportTicketCreateView
@@ -84,6 +93,10 @@ router.register(r"calf", CalfViewSet, basename="Calf")
 router.register(r"breedingbull", BreedingBullViewSet, basename="BreedingBull")
 router.register(r"storecattle", StoreCattleViewSet, basename="StoreCattle")
 router.register(r"geolocations", GeolocationAnimalViewSet, basename="Geolocation")
+router.register(
+    r"movement-stats", DailyMovementStatsViewSet, basename="DailyMovementStats"
+)
+router.register(r"stay-points", StayPointViewSet, basename="StayPoint")
 router.register(r"machinery", MachineryViewSet, basename="Machinery")
 router.register(r"events/calf", CalfEventViewSet, basename="CalfEvent")
 router.register(
@@ -136,6 +149,11 @@ urlpatterns = i18n_patterns(
                 path("users/reset-password/", ResetPasswordView.as_view()),
                 path("users/change-phone-num/", ChangePhoneNumberView.as_view()),
                 path("get-path/", GetAnimalPathView.as_view(), name="get_path"),
+                path(
+                    "get-path/export/",
+                    TrajectoryExportView.as_view(),
+                    name="export_path",
+                ),
                 path(
                     "calf/convert-to-adult/",
                     ConvertToAdultView.as_view(),
@@ -146,7 +164,16 @@ urlpatterns = i18n_patterns(
                     SimpleGroupedGeolocationsView.as_view(),
                     name="latest_grouped_geolocations",
                 ),
+                path(
+                    "tiles/<int:z>/<int:x>/<int:y>.mvt",
+                    FarmVectorTileView.as_view(),
+                    name="farm_vector_tile",
+                ),
+                path("live-positions/", FarmLivePositionsView.as_view()),
                 path("cadastres/search-cadastre/", SearchCadastreView.as_view()),
+                path("cadastres/<int:pk>/heatmap/", CadastreHeatmapView.as_view()),
+                path("tracker-sync/locks/", TrackerSyncLocksView.as_view()),
+                path("tracker-webhook/geolocations/", TrackerWebhookView.as_view()),
                 path("myfarm/", MyFarmView.as_view()),
                 path("indicators/latest/", LatestIndicatorsView.as_view()),
                 path("indicators/request/", RequestIndicatorsView.as_view()),
@@ -222,6 +249,10 @@ urlpatterns = i18n_patterns(
                 ),
                 path("dashboard/cow-skt-average/", CowSKTAverageView.as_view()),
                 path("dashboard/cow-count-by-year/", CowCountByYearView.as_view()),
+                path(
+                    "dashboard/herd-movement-average/",
+                    HerdMovementAverageView.as_view(),
+                ),
                 path("notifications/latest/", NotificationListView.as_view()),
                 path(
                     "notifications/mark-as-read/<int:pk>/",